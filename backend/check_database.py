@@ -1,33 +1,39 @@
 import sqlite3
-import json
+import sys
+
+from db_pool import read_conn
+from diagnostic_utils import loads_json
 
 def check_database():
     """Check what was stored in the database."""
-    conn = sqlite3.connect('firewall_tool.db')
-    cursor = conn.cursor()
-    
-    print("=== AUDIT SESSIONS ===")
-    cursor.execute("SELECT * FROM audit_sessions")
-    sessions = cursor.fetchall()
-    for session in sessions:
-        print(f"ID: {session[0]}, Name: {session[1]}, File: {session[4]}, Hash: {session[5]}")
-        if session[6]:  # config_metadata
-            metadata = json.loads(session[6])
-            print(f"  Metadata: {metadata}")
-    
-    print("\n=== FIREWALL RULES ===")
-    cursor.execute("SELECT * FROM firewall_rules")
-    rules = cursor.fetchall()
-    for rule in rules:
-        print(f"Rule: {rule[2]} | Type: {rule[3]} | From: {rule[4]} -> To: {rule[5]} | Src: {rule[6]} -> Dst: {rule[7]} | Service: {rule[8]} | Action: {rule[9]} | Position: {rule[10]} | Disabled: {bool(rule[11])}")
-    
-    print("\n=== OBJECT DEFINITIONS ===")
-    cursor.execute("SELECT * FROM object_definitions")
-    objects = cursor.fetchall()
-    for obj in objects:
-        print(f"Object: {obj[3]} ({obj[2]}) | Value: {obj[4]}")
-    
-    conn.close()
+    with read_conn() as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        out = []
+        write = out.append
+
+        write("=== AUDIT SESSIONS ===")
+        cursor.execute("SELECT id, session_name, filename, file_hash, config_metadata FROM audit_sessions")
+        for session in cursor:
+            write(f"ID: {session['id']}, Name: {session['session_name']}, File: {session['filename']}, Hash: {session['file_hash']}")
+            if session['config_metadata']:
+                metadata = loads_json(session['config_metadata'])
+                write(f"  Metadata: {metadata}")
+
+        write("\n=== FIREWALL RULES ===")
+        cursor.execute("""
+            SELECT rule_name, rule_type, src_zone, dst_zone, src, dst, service, action, position, is_disabled
+            FROM firewall_rules
+        """)
+        for rule in cursor:
+            write(f"Rule: {rule['rule_name']} | Type: {rule['rule_type']} | From: {rule['src_zone']} -> To: {rule['dst_zone']} | Src: {rule['src']} -> Dst: {rule['dst']} | Service: {rule['service']} | Action: {rule['action']} | Position: {rule['position']} | Disabled: {bool(rule['is_disabled'])}")
+
+        write("\n=== OBJECT DEFINITIONS ===")
+        cursor.execute("SELECT object_type, name, value FROM object_definitions")
+        for obj in cursor:
+            write(f"Object: {obj['name']} ({obj['object_type']}) | Value: {obj['value']}")
+
+    sys.stdout.write("\n".join(out) + "\n")
 
 if __name__ == "__main__":
     check_database()
@@ -3,7 +3,16 @@
 Check database differences between SET and CSV uploads.
 """
 
-import sqlite3
+from db_pool import read_conn, write_conn
+from diagnostic_utils import (
+    SNAPSHOT_OBJECT_SAMPLES,
+    SNAPSHOT_RULE_SAMPLES,
+    buffer_stdout,
+    detect_format,
+    ensure_indexes,
+    load_audit_snapshot,
+)
+
 
 def check_recent_uploads():
     """Check the most recent uploads and their differences."""
@@ -12,96 +21,86 @@ def check_recent_uploads():
     print("=" * 50)
     
     try:
-        conn = sqlite3.connect('firewall_tool.db')
-        cursor = conn.cursor()
-        
-        # Get recent audits
-        cursor.execute('''
-            SELECT id, session_name, filename 
-            FROM audit_sessions 
-            ORDER BY id DESC 
-            LIMIT 5
-        ''')
+        with write_conn() as conn:
+            ensure_indexes(conn)
         
-        audits = cursor.fetchall()
-        print("📋 Recent Audits:")
-        for audit_id, session_name, filename in audits:
-            format_type = "SET" if ".txt" in filename else "CSV" if ".csv" in filename else "XML" if ".xml" in filename else "UNKNOWN"
-            print(f"   {audit_id}: {filename} ({format_type})")
-        
-        if len(audits) >= 2:
-            # Compare the last two audits
+        with read_conn() as conn:
+            cursor = conn.cursor()
+            
+            # Get recent audits
+            cursor.execute('''
+                SELECT id, session_name, filename 
+                FROM audit_sessions 
+                ORDER BY id DESC 
+                LIMIT 5
+            ''')
+            
+            audits = cursor.fetchall()
+            print("📋 Recent Audits:")
+            for audit_id, session_name, filename in audits:
+                format_type = detect_format(filename)
+                print(f"   {audit_id}: {filename} ({format_type})")
+            
+            if len(audits) < 2:
+                print("\nℹ️  Fewer than two audits stored - nothing to compare")
+                return
+            
             audit1 = audits[0]  # Most recent
             audit2 = audits[1]  # Second most recent
             
-            format1 = "SET" if ".txt" in audit1[2] else "CSV" if ".csv" in audit1[2] else "UNKNOWN"
-            format2 = "SET" if ".txt" in audit2[2] else "CSV" if ".csv" in audit2[2] else "UNKNOWN"
+            if audit1[2] == audit2[2]:
+                print(f"\nℹ️  Last two audits are the same file ({audit1[2]}) - skipping comparison")
+                return
+            
+            format1 = detect_format(audit1[2])
+            format2 = detect_format(audit2[2])
             
             print(f"\n🔄 Comparing:")
             print(f"   {format1}: Audit {audit1[0]} - {audit1[2]}")
             print(f"   {format2}: Audit {audit2[0]} - {audit2[2]}")
             
             # Compare database contents
-            compare_database_data(cursor, audit1[0], format1, audit2[0], format2)
+            compare_database_data(audit1[0], format1, audit2[0], format2)
             
             # Check for parsing differences
             check_parsing_differences(cursor, audit1[0], format1, audit2[0], format2)
         
-        conn.close()
-        
+    
     except Exception as e:
         print(f"❌ Error: {str(e)}")
         import traceback
         traceback.print_exc()
 
-def compare_database_data(cursor, audit1_id, format1, audit2_id, format2):
+def compare_database_data(audit1_id, format1, audit2_id, format2):
     """Compare the actual data stored in the database."""
     
     print(f"\n📊 Database Content Comparison:")
     
+    # Bound format method for the per-rule row, built once per call
+    _RULE_FMT = "         {}. {}: {}→{} | {}→{} | {} | {}".format
+    
     results = {}
     
     for audit_id, format_name in [(audit1_id, format1), (audit2_id, format2)]:
-        # Count objects and rules
-        cursor.execute('SELECT COUNT(*) FROM object_definitions WHERE audit_id = ?', (audit_id,))
-        obj_count = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM firewall_rules WHERE audit_id = ?', (audit_id,))
-        rule_count = cursor.fetchone()[0]
+        snapshot = load_audit_snapshot(audit_id)
+        obj_count = snapshot['object_count']
+        rule_count = snapshot['rule_count']
         
         results[format_name] = {'objects': obj_count, 'rules': rule_count}
         
         print(f"   {format_name}: {obj_count} objects, {rule_count} rules")
         
-        # Get object details
-        cursor.execute('''
-            SELECT name, object_type, value, used_in_rules 
-            FROM object_definitions 
-            WHERE audit_id = ? 
-            ORDER BY name
-        ''', (audit_id,))
-        
-        objects = cursor.fetchall()
         print(f"      Objects:")
-        for name, obj_type, value, used_in_rules in objects[:8]:  # Show first 8
+        for name, obj_type, value, used_in_rules in snapshot['objects']:
             print(f"         {name} ({obj_type}) = '{value}' | Used: {used_in_rules}")
-        if len(objects) > 8:
-            print(f"         ... and {len(objects) - 8} more objects")
-        
-        # Get rule details
-        cursor.execute('''
-            SELECT rule_name, src_zone, dst_zone, src, dst, service, action, position 
-            FROM firewall_rules 
-            WHERE audit_id = ? 
-            ORDER BY position
-        ''', (audit_id,))
+        if obj_count > SNAPSHOT_OBJECT_SAMPLES:
+            print(f"         ... and {obj_count - SNAPSHOT_OBJECT_SAMPLES} more objects")
         
-        rules = cursor.fetchall()
         print(f"      Rules:")
-        for rule_name, src_zone, dst_zone, src, dst, service, action, position in rules[:5]:  # Show first 5
-            print(f"         {position}. {rule_name}: {src_zone}→{dst_zone} | {src}→{dst} | {service} | {action}")
-        if len(rules) > 5:
-            print(f"         ... and {len(rules) - 5} more rules")
+        for rule in snapshot['rules']:
+            print(_RULE_FMT(*rule))
+        if rule_count > SNAPSHOT_RULE_SAMPLES:
+            print(f"         ... and {rule_count - SNAPSHOT_RULE_SAMPLES} more rules")
     
     # Compare counts
     if len(results) == 2:
@@ -125,39 +124,53 @@ def check_parsing_differences(cursor, audit1_id, format1, audit2_id, format2):
     
     print(f"\n🔍 Parsing Difference Analysis:")
     
-    # Check for objects with same names but different values
+    # Check for objects with same names but different values: pivot both audits
+    # into one row per name rather than self-joining the table
     cursor.execute('''
-        SELECT o1.name, o1.value as value1, o2.value as value2
-        FROM object_definitions o1
-        JOIN object_definitions o2 ON o1.name = o2.name
-        WHERE o1.audit_id = ? AND o2.audit_id = ? AND o1.value != o2.value
-    ''', (audit1_id, audit2_id))
-    
-    value_diffs = cursor.fetchall()
-    if value_diffs:
-        print(f"   🔄 Objects with different values:")
-        for name, value1, value2 in value_diffs:
-            print(f"      {name}: '{value1}' vs '{value2}'")
-    else:
+        SELECT name,
+               MAX(CASE WHEN audit_id = :a1 THEN value END) AS value1,
+               MAX(CASE WHEN audit_id = :a2 THEN value END) AS value2
+        FROM object_definitions
+        WHERE audit_id IN (:a1, :a2)
+        GROUP BY name
+        HAVING value1 IS NOT NULL AND value2 IS NOT NULL AND value1 <> value2
+    ''', {'a1': audit1_id, 'a2': audit2_id})
+    
+    # Stream the pivoted rows; the header is printed on the first difference
+    value_diffs = 0
+    for name, value1, value2 in cursor:
+        if not value_diffs:
+            print(f"   🔄 Objects with different values:")
+        value_diffs += 1
+        print(f"      {name}: '{value1}' vs '{value2}'")
+    if not value_diffs:
         print(f"   ✅ No objects with different values found")
     
-    # Check for rules with same names but different properties
+    # Check for rules with same names but different properties, pivoted the same way
     cursor.execute('''
-        SELECT r1.rule_name, r1.src, r1.dst, r1.service, r2.src, r2.dst, r2.service
-        FROM firewall_rules r1
-        JOIN firewall_rules r2 ON r1.rule_name = r2.rule_name
-        WHERE r1.audit_id = ? AND r2.audit_id = ? 
-        AND (r1.src != r2.src OR r1.dst != r2.dst OR r1.service != r2.service)
-    ''', (audit1_id, audit2_id))
-    
-    rule_diffs = cursor.fetchall()
-    if rule_diffs:
-        print(f"   🔄 Rules with different properties:")
-        for rule_name, src1, dst1, svc1, src2, dst2, svc2 in rule_diffs:
-            print(f"      {rule_name}:")
-            print(f"         {format1}: {src1}→{dst1} | {svc1}")
-            print(f"         {format2}: {src2}→{dst2} | {svc2}")
-    else:
+        SELECT rule_name,
+               MAX(CASE WHEN audit_id = :a1 THEN src END) AS src1,
+               MAX(CASE WHEN audit_id = :a1 THEN dst END) AS dst1,
+               MAX(CASE WHEN audit_id = :a1 THEN service END) AS svc1,
+               MAX(CASE WHEN audit_id = :a2 THEN src END) AS src2,
+               MAX(CASE WHEN audit_id = :a2 THEN dst END) AS dst2,
+               MAX(CASE WHEN audit_id = :a2 THEN service END) AS svc2
+        FROM firewall_rules
+        WHERE audit_id IN (:a1, :a2)
+        GROUP BY rule_name
+        HAVING SUM(audit_id = :a1) > 0 AND SUM(audit_id = :a2) > 0
+           AND (src1 <> src2 OR dst1 <> dst2 OR svc1 <> svc2)
+    ''', {'a1': audit1_id, 'a2': audit2_id})
+    
+    rule_diffs = 0
+    for rule_name, src1, dst1, svc1, src2, dst2, svc2 in cursor:
+        if not rule_diffs:
+            print(f"   🔄 Rules with different properties:")
+        rule_diffs += 1
+        print(f"      {rule_name}:")
+        print(f"         {format1}: {src1}→{dst1} | {svc1}")
+        print(f"         {format2}: {src2}→{dst2} | {svc2}")
+    if not rule_diffs:
         print(f"   ✅ No rules with different properties found")
 
 def suggest_investigation_steps():
@@ -178,6 +191,8 @@ def suggest_investigation_steps():
     print(f"      - Compare parsing results step by step")
 
 if __name__ == "__main__":
+    buffer_stdout()
+    
     print("🚀 INVESTIGATING SET vs CSV PARSING DIFFERENCES")
     print("=" * 60)
     
@@ -3,7 +3,10 @@
 Check the most recent audit to understand what was actually parsed.
 """
 
-import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from db_pool import read_conn, write_conn
+from diagnostic_utils import API_BASE_URL, ensure_indexes, get_json_cached
 
 def check_recent_audit():
     """Check the most recent audit session."""
@@ -12,89 +15,94 @@ def check_recent_audit():
     print("=" * 40)
     
     try:
-        conn = sqlite3.connect('firewall_tool.db')
-        cursor = conn.cursor()
-        
-        # Get the most recent audit
-        cursor.execute("""
-            SELECT id, session_name, filename, status, start_time 
-            FROM audit_sessions 
-            ORDER BY id DESC 
-            LIMIT 1
-        """)
-        
-        audit = cursor.fetchone()
-        if not audit:
-            print("❌ No audit sessions found")
-            return
-        
-        audit_id, session_name, filename, status, start_time = audit
-        print(f"📋 Most Recent Audit:")
-        print(f"   ID: {audit_id}")
-        print(f"   Session: {session_name}")
-        print(f"   File: {filename}")
-        print(f"   Status: {status}")
-        print(f"   Time: {start_time}")
-        
-        # Check rules
-        cursor.execute("""
-            SELECT COUNT(*) FROM firewall_rules WHERE audit_session_id = ?
-        """, (audit_id,))
-        rule_count = cursor.fetchone()[0]
-        
-        cursor.execute("""
-            SELECT rule_name, src, dst, service, action, is_disabled
-            FROM firewall_rules 
-            WHERE audit_session_id = ?
-            ORDER BY position
-            LIMIT 10
-        """, (audit_id,))
-        rules = cursor.fetchall()
+        with write_conn() as conn:
+            ensure_indexes(conn)
         
-        print(f"\n📊 Rules: {rule_count} total")
-        if rules:
-            print(f"   Sample rules:")
-            for i, rule in enumerate(rules[:5]):
-                status = "DISABLED" if rule[5] else "ENABLED"
-                print(f"   {i+1}. {rule[0]}: {rule[1]} → {rule[2]} | {rule[3]} | {rule[4]} ({status})")
-        
-        # Check objects
-        cursor.execute("""
-            SELECT COUNT(*) FROM object_definitions WHERE audit_session_id = ?
-        """, (audit_id,))
-        object_count = cursor.fetchone()[0]
-        
-        cursor.execute("""
-            SELECT name, object_type, value, used_in_rules
-            FROM object_definitions 
-            WHERE audit_session_id = ?
-            ORDER BY name
-        """, (audit_id,))
-        objects = cursor.fetchall()
-        
-        print(f"\n📦 Objects: {object_count} total")
-        if objects:
-            used_count = sum(1 for obj in objects if obj[3] > 0)
-            unused_count = sum(1 for obj in objects if obj[3] == 0)
+        with read_conn() as conn:
+            cursor = conn.cursor()
             
-            print(f"   Used: {used_count}")
-            print(f"   Unused: {unused_count}")
+            # Get the most recent audit
+            cursor.execute("""
+                SELECT id, session_name, filename, start_time 
+                FROM audit_sessions 
+                ORDER BY id DESC 
+                LIMIT 1
+            """)
+            
+            audit = cursor.fetchone()
+            if not audit:
+                print("❌ No audit sessions found")
+                return
+            
+            audit_id, session_name, filename, start_time = audit
+            
+            # Start the API request now so its round-trip overlaps the DB queries below
+            executor = ThreadPoolExecutor(max_workers=1)
+            api_future = executor.submit(get_json_cached, f'{API_BASE_URL}/audits/{audit_id}/analysis')
+            executor.shutdown(wait=False)
+            
+            print(f"📋 Most Recent Audit:")
+            print(f"   ID: {audit_id}")
+            print(f"   Session: {session_name}")
+            print(f"   File: {filename}")
+            print(f"   Time: {start_time}")
+            
+            # Check rules
+            cursor.execute("""
+                SELECT COUNT(*) FROM firewall_rules WHERE audit_id = ?
+            """, (audit_id,))
+            rule_count = cursor.fetchone()[0]
+            
+            cursor.execute("""
+                SELECT rule_name, src, dst, service, action, is_disabled
+                FROM firewall_rules 
+                WHERE audit_id = ?
+                ORDER BY position
+                LIMIT 10
+            """, (audit_id,))
+            rules = cursor.fetchall()
+            
+            print(f"\n📊 Rules: {rule_count} total")
+            if rules:
+                print(f"   Sample rules:")
+                for i, rule in enumerate(rules[:5]):
+                    status = "DISABLED" if rule[5] else "ENABLED"
+                    print(f"   {i+1}. {rule[0]}: {rule[1]} → {rule[2]} | {rule[3]} | {rule[4]} ({status})")
+            
+            # Check objects: total, used and unused counts in one aggregate scan
+            cursor.execute("""
+                SELECT COUNT(*),
+                       COALESCE(SUM(used_in_rules > 0), 0),
+                       COALESCE(SUM(used_in_rules = 0), 0)
+                FROM object_definitions WHERE audit_id = ?
+            """, (audit_id,))
+            object_count, used_count, unused_count = cursor.fetchone()
+            
+            print(f"\n📦 Objects: {object_count} total")
+            if object_count:
+                print(f"   Used: {used_count}")
+                print(f"   Unused: {unused_count}")
+                
+                cursor.execute("""
+                    SELECT name, object_type, value, used_in_rules
+                    FROM object_definitions 
+                    WHERE audit_id = ?
+                    ORDER BY name
+                """, (audit_id,))
+                
+                print(f"   All objects:")
+                for i, obj in enumerate(cursor):
+                    usage = f"Used in {obj[3]} rules" if obj[3] > 0 else "UNUSED"
+                    print(f"   {i+1}. {obj[0]} ({obj[1]}) = {obj[2]} | {usage}")
             
-            print(f"   All objects:")
-            for i, obj in enumerate(objects):
-                usage = f"Used in {obj[3]} rules" if obj[3] > 0 else "UNUSED"
-                print(f"   {i+1}. {obj[0]} ({obj[1]}) = {obj[2]} | {usage}")
-        
-        conn.close()
         
         # Now check what the API returns
         print(f"\n🌐 Checking API Response...")
-        import requests
         
         try:
-            response = requests.get(f'http://127.0.0.1:8000/api/v1/audits/{audit_id}/analysis')
-            if response.status_code == 200:
-                data = response.json()['data']
+            status_code, payload = api_future.result()
+            if status_code == 200:
+                data = payload['data']
                 summary = data['analysis_summary']
                 
                 print(f"📈 API Summary:")
@@ -122,7 +130,7 @@ def check_recent_audit():
                     print(f"   ❌ Database and API have discrepancies!")
                 
             else:
-                print(f"❌ API request failed: {response.status_code}")
+                print(f"❌ API request failed: {status_code}")
         
         except Exception as e:
             print(f"❌ API check failed: {str(e)}")
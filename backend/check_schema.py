@@ -1,24 +1,32 @@
-import sqlite3
+from functools import lru_cache
+
+from db_pool import read_conn
+from diagnostic_utils import DB_PATH, db_mtime
+
+@lru_cache(maxsize=None)
+def _schema(path, mtime):
+    """Return the firewall_rules columns and one sample row.
+
+    ``mtime`` is only part of the cache key, so a rewritten database is
+    introspected again while repeated calls on an unchanged file are free.
+    """
+    with read_conn(path) as conn:
+        columns = conn.execute("PRAGMA table_info(firewall_rules)").fetchall()
+        rule = conn.execute("SELECT * FROM firewall_rules LIMIT 1").fetchone()
+    return columns, rule
 
 def check_schema():
     """Check the database schema."""
-    conn = sqlite3.connect('firewall_tool.db')
-    cursor = conn.cursor()
+    columns, rule = _schema(DB_PATH, db_mtime(DB_PATH))
     
     print("=== FIREWALL RULES TABLE SCHEMA ===")
-    cursor.execute("PRAGMA table_info(firewall_rules)")
-    columns = cursor.fetchall()
     for col in columns:
         print(f"Column {col[0]}: {col[1]} ({col[2]})")
     
     print("\n=== SAMPLE RULE DATA ===")
-    cursor.execute("SELECT * FROM firewall_rules LIMIT 1")
-    rule = cursor.fetchone()
     if rule:
         for i, value in enumerate(rule):
             print(f"Column {i}: {value}")
-    
-    conn.close()
 
 if __name__ == "__main__":
     check_schema()
@@ -3,8 +3,10 @@
 Compare the differences between SET and CSV format uploads of the same configuration.
 """
 
-import sqlite3
-import requests
+from concurrent.futures import ThreadPoolExecutor
+
+from db_pool import read_conn, write_conn
+from diagnostic_utils import API_BASE_URL, buffer_stdout, detect_format, ensure_indexes, get_json_cached, load_audit_snapshot
 
 def compare_recent_uploads():
     """Compare the most recent SET and CSV uploads."""
@@ -14,92 +16,70 @@ def compare_recent_uploads():
     
     try:
         # Get recent audits
-        conn = sqlite3.connect('firewall_tool.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, session_name, filename 
-            FROM audit_sessions 
-            ORDER BY id DESC 
-            LIMIT 5
-        ''')
+        with write_conn() as conn:
+            ensure_indexes(conn)
         
-        audits = cursor.fetchall()
-        print("📋 Recent Audits:")
-        for audit_id, session_name, filename in audits:
-            print(f"   {audit_id}: {filename} ({session_name})")
-        
-        if len(audits) >= 2:
-            # Assume the last 2 are SET and CSV of same config
-            audit1 = audits[0]  # Most recent
-            audit2 = audits[1]  # Second most recent
-            
-            print(f"\n🔄 Comparing Last Two Uploads:")
-            print(f"   Audit 1: {audit1[0]} - {audit1[2]}")
-            print(f"   Audit 2: {audit2[0]} - {audit2[2]}")
+        with read_conn() as conn:
+            cursor = conn.cursor()
             
-            # Determine which is SET and which is CSV
-            format1 = "SET" if ".txt" in audit1[2] else "CSV" if ".csv" in audit1[2] else "UNKNOWN"
-            format2 = "SET" if ".txt" in audit2[2] else "CSV" if ".csv" in audit2[2] else "UNKNOWN"
+            cursor.execute('''
+                SELECT id, session_name, filename 
+                FROM audit_sessions 
+                ORDER BY id DESC 
+                LIMIT 5
+            ''')
             
-            print(f"   Format 1: {format1}")
-            print(f"   Format 2: {format2}")
+            audits = cursor.fetchall()
+            print("📋 Recent Audits:")
+            for audit_id, session_name, filename in audits:
+                print(f"   {audit_id}: {filename} ({session_name})")
             
-            # Compare database contents
-            compare_database_contents(cursor, audit1[0], format1, audit2[0], format2)
+            if len(audits) >= 2:
+                # Assume the last 2 are SET and CSV of same config
+                audit1 = audits[0]  # Most recent
+                audit2 = audits[1]  # Second most recent
+                
+                print(f"\n🔄 Comparing Last Two Uploads:")
+                print(f"   Audit 1: {audit1[0]} - {audit1[2]}")
+                print(f"   Audit 2: {audit2[0]} - {audit2[2]}")
+                
+                # Determine which is SET and which is CSV
+                format1 = detect_format(audit1[2])
+                format2 = detect_format(audit2[2])
+                
+                print(f"   Format 1: {format1}")
+                print(f"   Format 2: {format2}")
+                
+                # Compare database contents
+                compare_database_contents(audit1[0], format1, audit2[0], format2)
+                
+                # Compare API analysis results
+                compare_analysis_results(audit1[0], format1, audit2[0], format2)
             
-            # Compare API analysis results
-            compare_analysis_results(audit1[0], format1, audit2[0], format2)
-        
-        conn.close()
         
     except Exception as e:
         print(f"❌ Error: {str(e)}")
         import traceback
         traceback.print_exc()
 
-def compare_database_contents(cursor, audit1_id, format1, audit2_id, format2):
+def compare_database_contents(audit1_id, format1, audit2_id, format2):
     """Compare the database contents for both audits."""
     
     print(f"\n📊 Database Contents Comparison:")
     
     for audit_id, format_name in [(audit1_id, format1), (audit2_id, format2)]:
-        # Count objects
-        cursor.execute('SELECT COUNT(*) FROM object_definitions WHERE audit_id = ?', (audit_id,))
-        obj_count = cursor.fetchone()[0]
+        snapshot = load_audit_snapshot(audit_id)
         
-        # Count rules
-        cursor.execute('SELECT COUNT(*) FROM firewall_rules WHERE audit_id = ?', (audit_id,))
-        rule_count = cursor.fetchone()[0]
-        
-        print(f"   {format_name} (ID {audit_id}): {obj_count} objects, {rule_count} rules")
+        print(f"   {format_name} (ID {audit_id}): {snapshot['object_count']} objects, {snapshot['rule_count']} rules")
         
         # Show sample objects
-        cursor.execute('''
-            SELECT name, object_type, value, used_in_rules 
-            FROM object_definitions 
-            WHERE audit_id = ? 
-            ORDER BY name 
-            LIMIT 5
-        ''', (audit_id,))
-        
-        objects = cursor.fetchall()
         print(f"      Sample objects:")
-        for name, obj_type, value, used_in_rules in objects:
+        for name, obj_type, value, used_in_rules in snapshot['objects'][:5]:
             print(f"         {name} ({obj_type}) = {value} | Used: {used_in_rules}")
         
         # Show sample rules
-        cursor.execute('''
-            SELECT rule_name, src_zone, dst_zone, src, dst, service, action 
-            FROM firewall_rules 
-            WHERE audit_id = ? 
-            ORDER BY position 
-            LIMIT 3
-        ''', (audit_id,))
-        
-        rules = cursor.fetchall()
         print(f"      Sample rules:")
-        for rule_name, src_zone, dst_zone, src, dst, service, action in rules:
+        for position, rule_name, src_zone, dst_zone, src, dst, service, action in snapshot['rules'][:3]:
             print(f"         {rule_name}: {src_zone}→{dst_zone} | {src}→{dst} | {service} | {action}")
 
 def compare_analysis_results(audit1_id, format1, audit2_id, format2):
@@ -107,12 +87,21 @@ def compare_analysis_results(audit1_id, format1, audit2_id, format2):
     
     print(f"\n📈 Analysis Results Comparison:")
     
-    for audit_id, format_name in [(audit1_id, format1), (audit2_id, format2)]:
+    # The two analyses are independent, so both requests are in flight at once
+    # over the shared keep-alive pool; results are still reported in order
+    audits = [(audit1_id, format1), (audit2_id, format2)]
+    with ThreadPoolExecutor(max_workers=len(audits)) as executor:
+        futures = [
+            executor.submit(get_json_cached, f'{API_BASE_URL}/audits/{audit_id}/analysis', timeout=30)
+            for audit_id, _ in audits
+        ]
+    
+    for (audit_id, format_name), future in zip(audits, futures):
         try:
-            response = requests.get(f'http://127.0.0.1:8000/api/v1/audits/{audit_id}/analysis')
+            status_code, payload = future.result()
             
-            if response.status_code == 200:
-                analysis_data = response.json()['data']
+            if status_code == 200:
+                analysis_data = payload['data']
                 summary = analysis_data['analysis_summary']
                 
                 print(f"   {format_name} Analysis (ID {audit_id}):")
@@ -138,7 +127,7 @@ def compare_analysis_results(audit1_id, format1, audit2_id, format2):
                     print(f"\n🔍 Key Differences Found:")
                     # This will be filled in when we run both
             else:
-                print(f"   {format_name} Analysis: ❌ Failed ({response.status_code})")
+                print(f"   {format_name} Analysis: ❌ Failed ({status_code})")
                 
         except Exception as e:
             print(f"   {format_name} Analysis: ❌ Error - {str(e)}")
@@ -163,6 +152,8 @@ def identify_parsing_differences():
     print("      - Object usage calculation variations")
 
 if __name__ == "__main__":
+    buffer_stdout()
+    
     print("🚀 INVESTIGATING SET vs CSV FORMAT DIFFERENCES")
     print("=" * 60)
     
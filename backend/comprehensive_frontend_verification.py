@@ -3,21 +3,128 @@
 Comprehensive frontend verification to identify any remaining issues.
 """
 
+import io
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 import time
 
+from diagnostic_utils import loads_json
+
+try:
+    from requests_toolbelt import MultipartEncoder
+    REQUESTS_TOOLBELT_AVAILABLE = True
+except ImportError:
+    REQUESTS_TOOLBELT_AVAILABLE = False
+
+try:
+    import fastjsonschema
+    FASTJSONSCHEMA_AVAILABLE = True
+except ImportError:
+    FASTJSONSCHEMA_AVAILABLE = False
+
+TEST_CONFIG_PATH = "../frontend_test_config.xml"
+
+# (connect, read) timeouts so a stalled backend fails fast instead of hanging
+TIMEOUT = (3, 30)
+HEALTH_TIMEOUT = (2, 3)
+
+# Shape of the /analysis payload the frontend relies on
+REQUIRED_OBJ_FIELDS = frozenset(('id', 'name', 'type', 'value', 'severity', 'description'))
+ANALYSIS_LISTS = ('unusedObjects', 'unusedRules', 'duplicateRules', 'shadowedRules', 'overlappingRules')
+ANALYSIS_SCHEMA = {
+    'type': 'object',
+    'required': ['analysis_summary', *ANALYSIS_LISTS],
+    'properties': {
+        'analysis_summary': {
+            'type': 'object',
+            'required': ['total_rules', 'total_objects', 'unused_objects_count', 'used_objects_count'],
+        },
+        **{name: {'type': 'array'} for name in ANALYSIS_LISTS},
+    },
+}
+
+def _compile_schema(schema):
+    """Build a validator for a flat object schema like ANALYSIS_SCHEMA.
+
+    Fallback for when fastjsonschema is not installed. Only the keywords used
+    by ANALYSIS_SCHEMA are supported. Like fastjsonschema's validators, the
+    returned function raises ValueError on the first violation.
+    """
+    types = {'object': dict, 'array': list}
+    required = frozenset(schema['required'])
+    checks = tuple(
+        (name, spec['type'], types[spec['type']], frozenset(spec.get('required', ())))
+        for name, spec in schema['properties'].items()
+    )
+    
+    def validate(data):
+        missing = required - data.keys()
+        if missing:
+            raise ValueError(f"data must contain {sorted(missing)} properties")
+        for name, type_name, expected, subfields in checks:
+            value = data[name]
+            if not isinstance(value, expected):
+                raise ValueError(f"data.{name} must be {type_name}")
+            if subfields:
+                missing = subfields - value.keys()
+                if missing:
+                    raise ValueError(f"data.{name} must contain {sorted(missing)} properties")
+        return data
+    
+    return validate
+
+# Compiled once; fastjsonschema.JsonSchemaException is a ValueError subclass
+if FASTJSONSCHEMA_AVAILABLE:
+    validate_analysis = fastjsonschema.compile(ANALYSIS_SCHEMA)
+else:
+    validate_analysis = _compile_schema(ANALYSIS_SCHEMA)
+
+def _open_test_config(path):
+    """Open the upload fixture: streamed from disk when MultipartEncoder is available, else read into memory."""
+    if REQUESTS_TOOLBELT_AVAILABLE:
+        return open(path, "rb")
+    return io.BytesIO(Path(path).read_bytes())
+
 def comprehensive_verification():
     """Perform comprehensive verification of the frontend integration."""
     
     print("🔍 COMPREHENSIVE FRONTEND VERIFICATION")
     print("=" * 60)
     
+    # One keep-alive session for the health check and the combined upload/analysis call
+    session = requests.Session()
+    session.headers.update({'Origin': 'http://localhost:5175'})
+    retries = Retry(total=2, backoff_factor=0.3, status_forcelist=(502, 503, 504))
+    session.mount('http://', HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=retries))
+    # Open the upload fixture in the background while the health probe is in flight
+    executor = ThreadPoolExecutor(max_workers=1)
+    config_future = executor.submit(_open_test_config, TEST_CONFIG_PATH)
+    executor.shutdown(wait=False)
+    try:
+        return _run_verification(session, config_future)
+    finally:
+        session.close()
+        _close_test_config(config_future)
+
+def _close_test_config(config_future):
+    """Close the fixture opened in the background, including when step 2 never ran."""
+    if config_future.exception() is None:
+        config_future.result().close()
+
+def _run_verification(session, config_future):
+    """Run the verification steps using the given HTTP session.
+
+    config_future resolves to a binary file object for the test configuration to upload.
+    """
+    
     # Step 1: Check backend health
     print("\n1️⃣ Backend Health Check")
     try:
-        health_response = requests.get('http://127.0.0.1:8000/health', 
-                                     headers={'Origin': 'http://localhost:5175'})
+        health_response = session.get('http://127.0.0.1:8000/health', timeout=HEALTH_TIMEOUT)
         if health_response.status_code == 200:
             print("   ✅ Backend is running and accessible")
             print("   ✅ CORS headers are present")
@@ -30,184 +137,151 @@ def comprehensive_verification():
     
     # Step 2: Test file upload and analysis
     print("\n2️⃣ File Upload and Analysis Test")
-    filename = "../frontend_test_config.xml"
     
     try:
-        with open(filename, "rb") as f:
+        with config_future.result() as f:
             files = {"file": ("frontend_test_config.xml", f, "application/xml")}
             data = {"session_name": "Comprehensive Frontend Verification"}
-            headers = {'Origin': 'http://localhost:5175'}
             
-            # Upload file
-            upload_response = requests.post(
-                'http://127.0.0.1:8000/api/v1/audits/',
-                files=files,
-                data=data,
-                headers=headers
-            )
+            # Upload and analyze in one request, streaming the multipart body from disk when possible
+            if REQUESTS_TOOLBELT_AVAILABLE:
+                body = MultipartEncoder(fields={**data, **files})
+                upload_response = session.post(
+                    'http://127.0.0.1:8000/api/v1/audits/verify',
+                    data=body,
+                    headers={'Content-Type': body.content_type},
+                    timeout=TIMEOUT
+                )
+            else:
+                upload_response = session.post(
+                    'http://127.0.0.1:8000/api/v1/audits/verify',
+                    files=files,
+                    data=data,
+                    timeout=TIMEOUT
+                )
             
             if upload_response.status_code == 200:
-                result = upload_response.json()
-                audit_id = result['data']['audit_id']
-                metadata = result['data']['metadata']
+                result = loads_json(upload_response.content)
+                audit = result['data']['audit']
+                analysis_data = result['data']['analysis']
+                audit_id = audit['audit_id']
+                metadata = audit['metadata']
                 
                 print(f"   ✅ File upload successful (Audit ID: {audit_id})")
                 print(f"   📊 Rules parsed: {metadata.get('rules_parsed', 0)}")
                 print(f"   📦 Objects parsed: {metadata.get('objects_parsed', 0)}")
+                print(f"   ✅ Analysis successful")
                 
-                # Get analysis
-                analysis_response = requests.get(
-                    f'http://127.0.0.1:8000/api/v1/audits/{audit_id}/analysis',
-                    headers=headers
-                )
+                # Step 3: Verify data structure matches frontend expectations
+                print("\n3️⃣ Data Structure Verification")
                 
-                if analysis_response.status_code == 200:
-                    analysis_result = analysis_response.json()
-                    analysis_data = analysis_result['data']
-                    
-                    print(f"   ✅ Analysis successful")
-                    
-                    # Step 3: Verify data structure matches frontend expectations
-                    print("\n3️⃣ Data Structure Verification")
-                    
-                    required_fields = {
-                        'analysis_summary': ['total_rules', 'total_objects', 'unused_objects_count', 'used_objects_count'],
-                        'unusedObjects': 'array',
-                        'unusedRules': 'array',
-                        'duplicateRules': 'array',
-                        'shadowedRules': 'array',
-                        'overlappingRules': 'array'
-                    }
-                    
-                    all_fields_present = True
-                    for field, expected_type in required_fields.items():
-                        if field in analysis_data:
-                            if expected_type == 'array':
-                                if isinstance(analysis_data[field], list):
-                                    print(f"   ✅ {field}: {len(analysis_data[field])} items")
-                                else:
-                                    print(f"   ❌ {field}: Not an array")
-                                    all_fields_present = False
-                            else:
-                                summary = analysis_data[field]
-                                missing_subfields = []
-                                for subfield in expected_type:
-                                    if subfield not in summary:
-                                        missing_subfields.append(subfield)
-                                
-                                if missing_subfields:
-                                    print(f"   ❌ {field}: Missing {missing_subfields}")
-                                    all_fields_present = False
-                                else:
-                                    print(f"   ✅ {field}: All required fields present")
-                        else:
-                            print(f"   ❌ {field}: MISSING")
-                            all_fields_present = False
-                    
-                    if not all_fields_present:
-                        print("   🚨 Data structure issues found!")
-                        return False
-                    
-                    # Step 4: Simulate frontend data processing
-                    print("\n4️⃣ Frontend Data Processing Simulation")
-                    
-                    # Exactly what FileUpload.tsx does
-                    total_objects = metadata.get('address_object_count', 0) + metadata.get('service_object_count', 0)
-                    
-                    frontend_data = {
-                        "summary": {
-                            "totalRules": metadata.get('rules_parsed', 0),
-                            "totalObjects": total_objects,
-                            "duplicateRules": len(analysis_data.get('duplicateRules', [])),
-                            "shadowedRules": len(analysis_data.get('shadowedRules', [])),
-                            "unusedRules": len(analysis_data.get('unusedRules', [])),
-                            "overlappingRules": len(analysis_data.get('overlappingRules', [])),
-                            "unusedObjects": len(analysis_data.get('unusedObjects', [])),
-                            "redundantObjects": 0,
-                            "analysisDate": result['data']['start_time'],
-                            "configVersion": metadata.get('firmware_version', 'Unknown'),
-                            "auditId": audit_id,
-                            "fileName": "frontend_test_config.xml",
-                            "fileHash": result['data']['file_hash'],
-                        },
-                        "duplicateRules": analysis_data.get('duplicateRules', []),
-                        "shadowedRules": analysis_data.get('shadowedRules', []),
-                        "unusedRules": analysis_data.get('unusedRules', []),
-                        "overlappingRules": analysis_data.get('overlappingRules', []),
-                        "unusedObjects": analysis_data.get('unusedObjects', []),
-                        "recommendations": []
-                    }
-                    
-                    print(f"   📊 Frontend Summary:")
-                    for key, value in frontend_data["summary"].items():
-                        if key not in ['analysisDate', 'fileHash', 'fileName', 'auditId']:
-                            print(f"      {key}: {value}")
-                    
-                    # Step 5: Verify specific values
-                    print("\n5️⃣ Value Verification")
-                    
-                    expected_values = {
-                        "totalRules": 10,
-                        "totalObjects": 10,
-                        "unusedObjects": 6,
-                        "unusedRules": 8
-                    }
-                    
-                    all_values_correct = True
-                    for key, expected in expected_values.items():
-                        actual = frontend_data["summary"][key]
-                        if actual == expected:
-                            print(f"   ✅ {key}: {actual} (matches expected {expected})")
-                        else:
-                            print(f"   ❌ {key}: {actual} (expected {expected})")
-                            all_values_correct = False
+                try:
+                    validate_analysis(analysis_data)
+                except ValueError as e:
+                    print(f"   ❌ {e}")
+                    print("   🚨 Data structure issues found!")
+                    return False
+                
+                print(f"   ✅ analysis_summary: All required fields present")
+                for field in ANALYSIS_LISTS:
+                    print(f"   ✅ {field}: {len(analysis_data[field])} items")
+                
+                # Step 4: Simulate frontend data processing
+                print("\n4️⃣ Frontend Data Processing Simulation")
+                
+                # Exactly what FileUpload.tsx does; look each list up once
+                rules_parsed = metadata.get('rules_parsed', 0)
+                total_objects = metadata.get('address_object_count', 0) + metadata.get('service_object_count', 0)
+                duplicate_rules = analysis_data.get('duplicateRules', [])
+                shadowed_rules = analysis_data.get('shadowedRules', [])
+                unused_rules = analysis_data.get('unusedRules', [])
+                overlapping_rules = analysis_data.get('overlappingRules', [])
+                unused_objects = analysis_data.get('unusedObjects', [])
+                
+                frontend_data = {
+                    "summary": {
+                        "totalRules": rules_parsed,
+                        "totalObjects": total_objects,
+                        "duplicateRules": len(duplicate_rules),
+                        "shadowedRules": len(shadowed_rules),
+                        "unusedRules": len(unused_rules),
+                        "overlappingRules": len(overlapping_rules),
+                        "unusedObjects": len(unused_objects),
+                        "redundantObjects": 0,
+                        "analysisDate": audit['start_time'],
+                        "configVersion": metadata.get('firmware_version', 'Unknown'),
+                        "auditId": audit_id,
+                        "fileName": "frontend_test_config.xml",
+                        "fileHash": audit['file_hash'],
+                    },
+                    "duplicateRules": duplicate_rules,
+                    "shadowedRules": shadowed_rules,
+                    "unusedRules": unused_rules,
+                    "overlappingRules": overlapping_rules,
+                    "unusedObjects": unused_objects,
+                    "recommendations": []
+                }
+                
+                print(f"   📊 Frontend Summary:")
+                for key, value in frontend_data["summary"].items():
+                    if key not in ['analysisDate', 'fileHash', 'fileName', 'auditId']:
+                        print(f"      {key}: {value}")
+                
+                # Step 5: Verify specific values
+                print("\n5️⃣ Value Verification")
+                
+                expected_values = {
+                    "totalRules": 10,
+                    "totalObjects": 10,
+                    "unusedObjects": 6,
+                    "unusedRules": 8
+                }
+                
+                all_values_correct = True
+                for key, expected in expected_values.items():
+                    actual = frontend_data["summary"][key]
+                    if actual == expected:
+                        print(f"   ✅ {key}: {actual} (matches expected {expected})")
+                    else:
+                        print(f"   ❌ {key}: {actual} (expected {expected})")
+                        all_values_correct = False
+                
+                if not all_values_correct:
+                    print("   🚨 Value mismatches found!")
+                    return False
+                
+                # Step 6: Check object details
+                print("\n6️⃣ Object Details Check")
+                
+                if len(unused_objects) > 0:
+                    sample_obj = unused_objects[0]
+                    missing = REQUIRED_OBJ_FIELDS - sample_obj.keys()
                     
-                    if not all_values_correct:
-                        print("   🚨 Value mismatches found!")
+                    if missing:
+                        print(f"   ❌ Missing object fields: {sorted(missing)}")
+                        print("   🚨 Object field issues found!")
                         return False
-                    
-                    # Step 6: Check object details
-                    print("\n6️⃣ Object Details Check")
-                    
-                    unused_objects = analysis_data.get('unusedObjects', [])
-                    if len(unused_objects) > 0:
-                        sample_obj = unused_objects[0]
-                        required_obj_fields = ['id', 'name', 'type', 'value', 'severity', 'description']
-                        
-                        obj_fields_present = True
-                        for field in required_obj_fields:
-                            if field in sample_obj:
-                                print(f"   ✅ Object.{field}: Present")
-                            else:
-                                print(f"   ❌ Object.{field}: MISSING")
-                                obj_fields_present = False
-                        
-                        if not obj_fields_present:
-                            print("   🚨 Object field issues found!")
-                            return False
-                    
-                    print("\n✅ ALL VERIFICATIONS PASSED!")
-                    
-                    # Step 7: Frontend display expectations
-                    print("\n7️⃣ Frontend Display Expectations")
-                    print("   🖥️  What the frontend SHOULD display:")
-                    print(f"      Dashboard:")
-                    print(f"         Total Rules: {frontend_data['summary']['totalRules']}")
-                    print(f"         Total Objects: {frontend_data['summary']['totalObjects']}")
-                    print(f"         Unused Objects: {frontend_data['summary']['unusedObjects']}")
-                    print(f"         Used Objects: {frontend_data['summary']['totalObjects'] - frontend_data['summary']['unusedObjects']}")
-                    
-                    print(f"      Analysis Tabs:")
-                    print(f"         Unused Objects: {len(frontend_data['unusedObjects'])} items")
-                    print(f"         Unused Rules: {len(frontend_data['unusedRules'])} items")
-                    print(f"         Duplicate Rules: {len(frontend_data['duplicateRules'])} items")
-                    print(f"         Shadowed Rules: {len(frontend_data['shadowedRules'])} items")
-                    print(f"         Overlapping Rules: {len(frontend_data['overlappingRules'])} items")
-                    
-                    return True
-                else:
-                    print(f"   ❌ Analysis failed: {analysis_response.status_code}")
-                    return False
+                    print(f"   ✅ Object fields present: {', '.join(sorted(REQUIRED_OBJ_FIELDS))}")
+                
+                print("\n✅ ALL VERIFICATIONS PASSED!")
+                
+                # Step 7: Frontend display expectations
+                print("\n7️⃣ Frontend Display Expectations")
+                print("   🖥️  What the frontend SHOULD display:")
+                print(f"      Dashboard:")
+                print(f"         Total Rules: {frontend_data['summary']['totalRules']}")
+                print(f"         Total Objects: {frontend_data['summary']['totalObjects']}")
+                print(f"         Unused Objects: {frontend_data['summary']['unusedObjects']}")
+                print(f"         Used Objects: {frontend_data['summary']['totalObjects'] - frontend_data['summary']['unusedObjects']}")
+                
+                print(f"      Analysis Tabs:")
+                print(f"         Unused Objects: {len(frontend_data['unusedObjects'])} items")
+                print(f"         Unused Rules: {len(frontend_data['unusedRules'])} items")
+                print(f"         Duplicate Rules: {len(frontend_data['duplicateRules'])} items")
+                print(f"         Shadowed Rules: {len(frontend_data['shadowedRules'])} items")
+                print(f"         Overlapping Rules: {len(frontend_data['overlappingRules'])} items")
+                
+                return True
             else:
                 print(f"   ❌ Upload failed: {upload_response.status_code}")
                 return False
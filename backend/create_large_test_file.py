@@ -3,6 +3,53 @@
 Create a large XML test file to test streaming XML parsing functionality.
 """
 
+import copy
+import os
+
+from lxml import etree
+
+# Entries serialised between explicit flushes of the incremental writer
+FLUSH_EVERY = 1000
+
+# Same declaration the hand-written fixture always had; lxml's
+# write_declaration() would emit single quotes and lower-case utf-8
+XML_DECLARATION = b'<?xml version="1.0" encoding="UTF-8"?>\n'
+
+def _newline(xf, depth):
+    """Write the line break and two-space indent that precede a tag at depth."""
+    xf.write('\n' + '  ' * depth)
+
+def _member_list(parent, tag, member):
+    """Append a <tag><member>member</member></tag> child to parent."""
+    etree.SubElement(etree.SubElement(parent, tag), 'member').text = member
+
+def _rule_template(disabled=False):
+    """Build the invariant part of a generated rule; member texts are filled per copy."""
+    entry = etree.Element('entry')
+    for tag, member in (('from', 'trust'), ('to', 'untrust'), ('source', None), ('destination', None), ('service', None)):
+        _member_list(entry, tag, member)
+    etree.SubElement(entry, 'action').text = 'allow'
+    if disabled:
+        etree.SubElement(entry, 'disabled').text = 'yes'
+    return entry
+
+def _indented(element, depth):
+    """Indent element's contents for a tag written at depth, matching the file layout."""
+    etree.indent(element, space='  ', level=depth)
+    return element
+
+# Prebuilt entry skeletons, already indented for the depth they are written
+# at: each generated entry is a C-level deepcopy with only the varying
+# attribute/text values set, instead of a fresh element tree
+ADDRESS_TEMPLATE = etree.Element('entry')
+etree.SubElement(ADDRESS_TEMPLATE, 'ip-netmask')
+_indented(ADDRESS_TEMPLATE, 6)
+SERVICE_TEMPLATE = etree.Element('entry')
+etree.SubElement(etree.SubElement(etree.SubElement(SERVICE_TEMPLATE, 'protocol'), 'tcp'), 'port')
+_indented(SERVICE_TEMPLATE, 6)
+RULE_TEMPLATE = _indented(_rule_template(), 8)
+DISABLED_RULE_TEMPLATE = _indented(_rule_template(disabled=True), 8)
+
 def create_large_xml_file(filename: str, num_rules: int = 1000, num_objects: int = 500):
     """
     Create a large XML configuration file for testing streaming parser.
@@ -17,87 +64,90 @@ def create_large_xml_file(filename: str, num_rules: int = 1000, num_objects: int
     print(f"  Rules: {num_rules}")
     print(f"  Objects: {num_objects}")
     
-    with open(filename, 'w', encoding='utf-8') as f:
-        # XML header
-        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
-        f.write('<config version="10.1.0" urldb="paloaltonetworks">\n')
-        f.write('  <devices>\n')
-        f.write('    <entry name="localhost.localdomain">\n')
-        f.write('      <deviceconfig>\n')
-        f.write('        <system>\n')
-        f.write('          <version>10.1.0</version>\n')
-        f.write('          <hostname>PA-VM-LARGE</hostname>\n')
-        f.write('        </system>\n')
-        f.write('      </deviceconfig>\n')
-        f.write('      <vsys>\n')
-        f.write('        <entry name="vsys1">\n')
-        
-        # Generate address objects
-        f.write('          <address>\n')
-        for i in range(num_objects // 2):
-            f.write(f'            <entry name="Server-{i:04d}">\n')
-            f.write(f'              <ip-netmask>192.168.{i // 254}.{i % 254 + 1}/32</ip-netmask>\n')
-            f.write('            </entry>\n')
-        f.write('          </address>\n')
-        
-        # Generate service objects
-        f.write('          <service>\n')
-        for i in range(num_objects // 2):
-            port = 8000 + (i % 1000)
-            f.write(f'            <entry name="Service-{i:04d}">\n')
-            f.write('              <protocol>\n')
-            f.write('                <tcp>\n')
-            f.write(f'                  <port>{port}</port>\n')
-            f.write('                </tcp>\n')
-            f.write('              </protocol>\n')
-            f.write('            </entry>\n')
-        f.write('          </service>\n')
-        
-        # Generate security rules
-        f.write('          <rulebase>\n')
-        f.write('            <security>\n')
-        f.write('              <rules>\n')
-        
-        for i in range(num_rules):
-            src_obj = f"Server-{i % (num_objects // 2):04d}"
-            dst_obj = f"Server-{(i + 1) % (num_objects // 2):04d}"
-            svc_obj = f"Service-{i % (num_objects // 2):04d}"
-            
-            f.write(f'                <entry name="Rule-{i:04d}">\n')
-            f.write('                  <from>\n')
-            f.write('                    <member>trust</member>\n')
-            f.write('                  </from>\n')
-            f.write('                  <to>\n')
-            f.write('                    <member>untrust</member>\n')
-            f.write('                  </to>\n')
-            f.write('                  <source>\n')
-            f.write(f'                    <member>{src_obj}</member>\n')
-            f.write('                  </source>\n')
-            f.write('                  <destination>\n')
-            f.write(f'                    <member>{dst_obj}</member>\n')
-            f.write('                  </destination>\n')
-            f.write('                  <service>\n')
-            f.write(f'                    <member>{svc_obj}</member>\n')
-            f.write('                  </service>\n')
-            f.write('                  <action>allow</action>\n')
-            
-            # Make some rules disabled for testing
-            if i % 10 == 0:
-                f.write('                  <disabled>yes</disabled>\n')
-                
-            f.write('                </entry>\n')
-        
-        f.write('              </rules>\n')
-        f.write('            </security>\n')
-        f.write('          </rulebase>\n')
-        f.write('        </entry>\n')
-        f.write('      </vsys>\n')
-        f.write('    </entry>\n')
-        f.write('  </devices>\n')
-        f.write('</config>\n')
+    half = num_objects // 2
+    # Object names are shared by the object entries and the rule members
+    addr_names = ['Server-%04d' % k for k in range(half)]
+    svc_names = ['Service-%04d' % k for k in range(half)]
+    
+    deviceconfig = etree.Element('deviceconfig')
+    system = etree.SubElement(deviceconfig, 'system')
+    etree.SubElement(system, 'version').text = '10.1.0'
+    etree.SubElement(system, 'hostname').text = 'PA-VM-LARGE'
+    _indented(deviceconfig, 3)
+    
+    # lxml serialises straight into the binary file as UTF-8 bytes, so no
+    # TextIOWrapper or Python-level encoder runs on the way out; the
+    # declaration and final newline are the only bytes written by hand
+    with open(filename, 'wb') as f:
+        f.write(XML_DECLARATION)
+        with etree.xmlfile(f, encoding='utf-8') as xf:
+            with xf.element('config', version='10.1.0', urldb='paloaltonetworks'):
+                _newline(xf, 1)
+                with xf.element('devices'):
+                    _newline(xf, 2)
+                    with xf.element('entry', name='localhost.localdomain'):
+                        _newline(xf, 3)
+                        xf.write(deviceconfig)
+                        _newline(xf, 3)
+                        with xf.element('vsys'):
+                            _newline(xf, 4)
+                            with xf.element('entry', name='vsys1'):
+                                # Generate address objects
+                                _newline(xf, 5)
+                                with xf.element('address'):
+                                    for i in range(half):
+                                        entry = copy.deepcopy(ADDRESS_TEMPLATE)
+                                        entry.set('name', addr_names[i])
+                                        entry[0].text = '192.168.%d.%d/32' % (i // 254, i % 254 + 1)
+                                        _newline(xf, 6)
+                                        xf.write(entry)
+                                        if i % FLUSH_EVERY == FLUSH_EVERY - 1:
+                                            xf.flush()
+                                    _newline(xf, 5)
+                                
+                                # Generate service objects
+                                _newline(xf, 5)
+                                with xf.element('service'):
+                                    for i in range(half):
+                                        entry = copy.deepcopy(SERVICE_TEMPLATE)
+                                        entry.set('name', svc_names[i])
+                                        entry[0][0][0].text = '%d' % (8000 + (i % 1000))
+                                        _newline(xf, 6)
+                                        xf.write(entry)
+                                        if i % FLUSH_EVERY == FLUSH_EVERY - 1:
+                                            xf.flush()
+                                    _newline(xf, 5)
+                                
+                                # Generate security rules
+                                _newline(xf, 5)
+                                with xf.element('rulebase'):
+                                    _newline(xf, 6)
+                                    with xf.element('security'):
+                                        _newline(xf, 7)
+                                        with xf.element('rules'):
+                                            for i in range(num_rules):
+                                                # Make some rules disabled for testing
+                                                template = DISABLED_RULE_TEMPLATE if i % 10 == 0 else RULE_TEMPLATE
+                                                entry = copy.deepcopy(template)
+                                                entry.set('name', 'Rule-%04d' % i)
+                                                entry[2][0].text = addr_names[i % half]
+                                                entry[3][0].text = addr_names[(i + 1) % half]
+                                                entry[4][0].text = svc_names[i % half]
+                                                _newline(xf, 8)
+                                                xf.write(entry)
+                                                if i % FLUSH_EVERY == FLUSH_EVERY - 1:
+                                                    xf.flush()
+                                            _newline(xf, 7)
+                                        _newline(xf, 6)
+                                    _newline(xf, 5)
+                                _newline(xf, 4)
+                            _newline(xf, 3)
+                        _newline(xf, 2)
+                    _newline(xf, 1)
+                _newline(xf, 0)
+        f.write(b'\n')
     
     # Get file size
-    import os
     file_size = os.path.getsize(filename)
     print(f"✅ Created {filename} ({file_size / 1024 / 1024:.1f}MB)")
     
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Connection pool shared by the diagnostic scripts: one writer, N readers.
+"""
+
+import atexit
+import queue
+import threading
+from contextlib import contextmanager
+
+from diagnostic_utils import DB_PATH, open_db
+
+READ_POOL_SIZE = 4
+
+_read_pools = {}
+_write_conns = {}
+_pools_lock = threading.Lock()
+_write_lock = threading.Lock()
+
+def _read_pool(path):
+    """Return the reader queue for a database path, creating it on first use."""
+    with _pools_lock:
+        pool = _read_pools.get(path)
+        if pool is None:
+            pool = _read_pools[path] = queue.Queue(maxsize=READ_POOL_SIZE)
+        return pool
+
+@contextmanager
+def read_conn(path=DB_PATH):
+    """Borrow a read-only connection from the pool.
+
+    A new connection is opened when the pool is empty; on release it goes back
+    to the pool, or is closed if the pool already holds READ_POOL_SIZE idle
+    connections. The row factory is reset so every borrower starts with
+    plain tuples.
+    """
+    pool = _read_pool(path)
+    try:
+        conn = pool.get_nowait()
+    except queue.Empty:
+        conn = open_db(path, check_same_thread=False)
+    try:
+        yield conn
+    finally:
+        conn.row_factory = None
+        try:
+            pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+@contextmanager
+def read_snapshot(path=DB_PATH):
+    """Borrow a pooled reader with the whole block in one read transaction.
+
+    Every query in the block shares one BEGIN DEFERRED transaction, so they
+    see a single consistent snapshot and take the shared lock once instead
+    of once per statement. The transaction is ended when the block exits.
+    """
+    with read_conn(path) as conn:
+        conn.execute("BEGIN DEFERRED")
+        try:
+            yield conn
+        finally:
+            conn.rollback()
+
+@contextmanager
+def write_conn(path=DB_PATH):
+    """Hold the single writable connection for a database path.
+
+    Writers are serialised by a lock; the block's changes are committed on
+    success and rolled back if it raises.
+    """
+    with _write_lock:
+        conn = _write_conns.get(path)
+        if conn is None:
+            conn = _write_conns[path] = open_db(path, read_only=False, check_same_thread=False)
+        with conn:
+            yield conn
+
+@atexit.register
+def close_all():
+    """Close every pooled connection."""
+    with _pools_lock:
+        for pool in _read_pools.values():
+            while True:
+                try:
+                    pool.get_nowait().close()
+                except queue.Empty:
+                    break
+        _read_pools.clear()
+    with _write_lock:
+        for conn in _write_conns.values():
+            conn.close()
+        _write_conns.clear()
@@ -3,6 +3,8 @@
 Debug the analysis endpoint error to see what's causing the 500 error.
 """
 
+from db_pool import read_conn
+
 def debug_analysis_error():
     """Debug the analysis endpoint error."""
     
@@ -13,19 +15,15 @@ def debug_analysis_error():
         # Test the analysis function directly
         from src.utils.parse_config import analyze_rule_usage
         
-        # Get a SET format audit ID
-        import sqlite3
-        conn = sqlite3.connect('firewall_tool.db')
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT id FROM audit_sessions 
-            WHERE filename LIKE '%sample4%'
-            ORDER BY id DESC 
-            LIMIT 1
-        """)
+        # Get a SET format audit ID from the shared pooled connection
+        with read_conn() as conn:
+            audit = conn.execute("""
+                SELECT id FROM audit_sessions 
+                WHERE filename LIKE '%sample4%'
+                ORDER BY id DESC 
+                LIMIT 1
+            """).fetchone()
         
-        audit = cursor.fetchone()
         if not audit:
             print("❌ No SET audit found")
             return
@@ -33,8 +31,6 @@ def debug_analysis_error():
         audit_id = audit[0]
         print(f"📋 Testing analyze_rule_usage({audit_id})...")
         
-        conn.close()
-        
         # Call the function directly to see the error
         result = analyze_rule_usage(audit_id)
         
@@ -4,138 +4,187 @@ Debug why the analysis logic is not detecting obvious duplicates and unused item
 """
 
 import sqlite3
+import sys
+from typing import NamedTuple
 
-def debug_analysis_logic():
-    """Debug the analysis logic to see why it's missing obvious issues."""
+from db_pool import read_conn, write_conn
+from diagnostic_utils import buffer_stdout, ensure_indexes, latest_audit, load_audit_counts
+
+# Separator for GROUP_CONCAT name lists; object/rule names may contain commas
+NAME_SEP = chr(31)
+
+# Groups of identical objects/enabled rules, names in listing order; only the
+# duplicate groups leave SQLite
+SQL_DUPLICATE_OBJECTS = f"""
+    SELECT value, GROUP_CONCAT(name, char({ord(NAME_SEP)}))
+    FROM (SELECT object_type, value, name FROM object_definitions WHERE audit_id = ? ORDER BY name)
+    GROUP BY object_type, value
+    HAVING COUNT(*) > 1
+"""
+SQL_DUPLICATE_RULES = f"""
+    SELECT GROUP_CONCAT(rule_name, char({ord(NAME_SEP)}))
+    FROM (
+        SELECT src_zone, dst_zone, src, dst, service, action, rule_name
+        FROM firewall_rules
+        WHERE audit_id = ? AND NOT COALESCE(is_disabled, 0)
+        ORDER BY rule_name
+    )
+    GROUP BY src_zone, dst_zone, src, dst, service, action
+    HAVING COUNT(*) > 1
+"""
+# Objects no rule references, computed from the rules themselves rather than
+# the stored used_in_rules counter. Each of src/dst/service holds a single
+# object name, so an exact-match set difference against the three columns is
+# the reference check; EXCEPT runs it as one b-tree set operation in SQLite.
+SQL_UNREFERENCED_OBJECTS = """
+    SELECT name FROM object_definitions WHERE audit_id = :audit_id
+    EXCEPT
+    SELECT ref FROM (
+        SELECT src AS ref FROM firewall_rules WHERE audit_id = :audit_id
+        UNION ALL SELECT dst FROM firewall_rules WHERE audit_id = :audit_id
+        UNION ALL SELECT service FROM firewall_rules WHERE audit_id = :audit_id
+    )
+    ORDER BY 1
+"""
+
+class AnalysisCounts(NamedTuple):
+    """Issue counts found by the manual analysis."""
+    duplicate_objects: int
+    duplicate_rules: int
+    unused_objects: int
+    unused_rules: int
+
+# What the reference test configuration should produce
+EXPECTED_COUNTS = AnalysisCounts(duplicate_objects=2, duplicate_rules=2, unused_objects=1, unused_rules=1)
+
+# Per-line listing templates; rows are sqlite3.Row objects indexed by column name
+OBJECT_LINE = "   {0}. '{1[name]}' ({1[object_type]}) = {1[value]} | Used: {1[used_in_rules]}\n".format
+RULE_LINE = "   {0}. '{1[rule_name]}' | {1[src_zone]}→{1[dst_zone]} | {1[src]}→{1[dst]} | {1[service]} | {1[action]} | {2}\n".format
+DUPLICATE_OBJECT_LINE = "   DUPLICATE OBJECT: '{0}' duplicates '{1}' (both = {2})\n".format
+DUPLICATE_RULE_LINE = "   DUPLICATE RULE: '{0}' duplicates '{1}'\n".format
+NAME_LINE = "   - {}\n".format
+
+def debug_analysis_logic(verbose=True):
+    """Debug the analysis logic to see why it's missing obvious issues.
+
+    With verbose=False only aggregate counts and the duplicate groups are
+    read; the per-object and per-rule listings are skipped.
+    """
     
     print("🔍 DEBUGGING ANALYSIS LOGIC")
     print("=" * 50)
     
     try:
-        # Get the most recent audit
-        conn = sqlite3.connect('firewall_tool.db')
-        cursor = conn.cursor()
+        with write_conn() as conn:
+            ensure_indexes(conn)
         
-        cursor.execute("""
-            SELECT id FROM audit_sessions ORDER BY id DESC LIMIT 1
-        """)
-        
-        audit = cursor.fetchone()
+        # Get the most recent audit (cached until the database changes)
+        audit = latest_audit()
         if not audit:
             print("❌ No audit sessions found")
             return
         
         audit_id = audit[0]
         
-        # Get all objects
-        cursor.execute("""
-            SELECT name, object_type, value, used_in_rules
-            FROM object_definitions 
-            WHERE audit_id = ?
-            ORDER BY name
-        """, (audit_id,))
-        
-        objects = cursor.fetchall()
-        
-        print(f"📦 Objects in Database ({len(objects)}):")
-        for i, obj in enumerate(objects):
-            name, obj_type, value, used_in_rules = obj
-            print(f"   {i+1}. '{name}' ({obj_type}) = {value} | Used: {used_in_rules}")
-        
-        # Get all rules
-        cursor.execute("""
-            SELECT rule_name, src_zone, dst_zone, src, dst, service, action, is_disabled
-            FROM firewall_rules 
-            WHERE audit_id = ?
-            ORDER BY rule_name
-        """, (audit_id,))
-        
-        rules = cursor.fetchall()
-        
-        print(f"\n📋 Rules in Database ({len(rules)}):")
-        for i, rule in enumerate(rules):
-            rule_name, src_zone, dst_zone, src, dst, service, action, is_disabled = rule
-            status = "DISABLED" if is_disabled else "ENABLED"
-            print(f"   {i+1}. '{rule_name}' | {src_zone}→{dst_zone} | {src}→{dst} | {service} | {action} | {status}")
-        
-        # Manual duplicate detection
-        print(f"\n🔍 Manual Duplicate Detection:")
-        
-        # Check for duplicate objects (same value)
-        object_values = {}
-        duplicate_objects = []
-        
-        for name, obj_type, value, used_in_rules in objects:
-            key = f"{obj_type}:{value}"
-            if key in object_values:
-                original = object_values[key]
-                duplicate_objects.append((name, original, value))
-                print(f"   DUPLICATE OBJECT: '{name}' duplicates '{original}' (both = {value})")
-            else:
-                object_values[key] = name
-        
-        print(f"   Manual duplicate objects found: {len(duplicate_objects)}")
-        
-        # Check for duplicate rules (same signature)
-        rule_signatures = {}
-        duplicate_rules = []
-        
-        for rule_name, src_zone, dst_zone, src, dst, service, action, is_disabled in rules:
-            if not is_disabled:  # Only check enabled rules
-                signature = f"{src_zone}-{dst_zone}-{src}-{dst}-{service}-{action}"
-                if signature in rule_signatures:
-                    original = rule_signatures[signature]
-                    duplicate_rules.append((rule_name, original))
-                    print(f"   DUPLICATE RULE: '{rule_name}' duplicates '{original}'")
-                else:
-                    rule_signatures[signature] = rule_name
-        
-        print(f"   Manual duplicate rules found: {len(duplicate_rules)}")
-        
-        # Check for unused objects (used_in_rules = 0)
-        unused_objects = [name for name, obj_type, value, used_in_rules in objects if used_in_rules == 0]
-        print(f"\n📦 Manual Unused Objects: {len(unused_objects)}")
-        for name in unused_objects:
-            print(f"   - {name}")
-        
-        # Check for unused rules (disabled or not referenced)
-        unused_rules = [rule_name for rule_name, src_zone, dst_zone, src, dst, service, action, is_disabled in rules if is_disabled]
-        print(f"\n📋 Manual Unused Rules: {len(unused_rules)}")
-        for name in unused_rules:
-            print(f"   - {name}")
-        
-        # Summary of manual analysis
-        print(f"\n📊 Manual Analysis Summary:")
-        print(f"   Total objects: {len(objects)}")
-        print(f"   Total rules: {len(rules)}")
-        print(f"   Duplicate objects: {len(duplicate_objects)}")
-        print(f"   Duplicate rules: {len(duplicate_rules)}")
-        print(f"   Unused objects: {len(unused_objects)}")
-        print(f"   Unused rules: {len(unused_rules)}")
-        
-        # Compare with expected
-        expected = {
-            "duplicate_objects": 2,
-            "duplicate_rules": 2,
-            "unused_objects": 1,
-            "unused_rules": 1
-        }
-        
-        actual = {
-            "duplicate_objects": len(duplicate_objects),
-            "duplicate_rules": len(duplicate_rules),
-            "unused_objects": len(unused_objects),
-            "unused_rules": len(unused_rules)
-        }
-        
-        print(f"\n🎯 Manual Analysis vs Expected:")
-        for key in expected:
-            expected_val = expected[key]
-            actual_val = actual[key]
-            status = "✅" if actual_val == expected_val else "❌"
-            print(f"   {key}: Expected={expected_val}, Manual={actual_val} {status}")
-        
-        conn.close()
+        with read_conn() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            
+            # Totals come from one aggregate query; rows are only fetched for the listings
+            counts = load_audit_counts(conn, audit_id)
+            
+            if verbose:
+                # Get all objects
+                cursor.execute("""
+                    SELECT name, object_type, value, used_in_rules
+                    FROM object_definitions 
+                    WHERE audit_id = ?
+                    ORDER BY name
+                """, (audit_id,))
+                
+                # Rows are formatted as the cursor yields them
+                print(f"📦 Objects in Database ({counts['objects']}):")
+                sys.stdout.writelines(OBJECT_LINE(i, obj) for i, obj in enumerate(cursor, 1))
+                
+                # Get all rules
+                cursor.execute("""
+                    SELECT rule_name, src_zone, dst_zone, src, dst, service, action, is_disabled
+                    FROM firewall_rules 
+                    WHERE audit_id = ?
+                    ORDER BY rule_name
+                """, (audit_id,))
+                
+                print(f"\n📋 Rules in Database ({counts['rules']}):")
+                unused_rules = []
+                write = sys.stdout.write
+                for i, rule in enumerate(cursor, 1):
+                    if rule['is_disabled']:
+                        write(RULE_LINE(i, rule, "DISABLED"))
+                        unused_rules.append(rule['rule_name'])
+                    else:
+                        write(RULE_LINE(i, rule, "ENABLED"))
+            
+            # Manual duplicate detection
+            print(f"\n🔍 Manual Duplicate Detection:")
+            
+            # Check for duplicate objects (same type and value); the first name in
+            # each group is the original, reported in name order like the listing
+            duplicate_objects = []
+            for value, names in cursor.execute(SQL_DUPLICATE_OBJECTS, (audit_id,)):
+                original, *others = names.split(NAME_SEP)
+                duplicate_objects.extend((name, original, value) for name in others)
+            duplicate_objects.sort()
+            
+            sys.stdout.writelines(DUPLICATE_OBJECT_LINE(*duplicate) for duplicate in duplicate_objects)
+            
+            print(f"   Manual duplicate objects found: {len(duplicate_objects)}")
+            
+            # Check for duplicate rules (same signature, enabled rules only)
+            duplicate_rules = []
+            for (names,) in cursor.execute(SQL_DUPLICATE_RULES, (audit_id,)):
+                original, *others = names.split(NAME_SEP)
+                duplicate_rules.extend((rule_name, original) for rule_name in others)
+            duplicate_rules.sort()
+            
+            sys.stdout.writelines(DUPLICATE_RULE_LINE(*duplicate) for duplicate in duplicate_rules)
+            
+            print(f"   Manual duplicate rules found: {len(duplicate_rules)}")
+            
+            # Check for unused objects (not referenced by any rule)
+            unused_objects = [name for (name,) in cursor.execute(SQL_UNREFERENCED_OBJECTS, {'audit_id': audit_id})]
+            print(f"\n📦 Manual Unused Objects: {len(unused_objects)}")
+            if verbose:
+                sys.stdout.writelines(map(NAME_LINE, unused_objects))
+            if len(unused_objects) != counts['unused_objects']:
+                print(f"   ⚠️  Stored used_in_rules counter reports {counts['unused_objects']} unused objects")
+            
+            # Check for unused rules (disabled or not referenced)
+            print(f"\n📋 Manual Unused Rules: {counts['disabled_rules']}")
+            if verbose:
+                sys.stdout.writelines(map(NAME_LINE, unused_rules))
+            
+            # Summary of manual analysis
+            print(f"\n📊 Manual Analysis Summary:")
+            print(f"   Total objects: {counts['objects']}")
+            print(f"   Total rules: {counts['rules']}")
+            print(f"   Duplicate objects: {len(duplicate_objects)}")
+            print(f"   Duplicate rules: {len(duplicate_rules)}")
+            print(f"   Unused objects: {len(unused_objects)}")
+            print(f"   Unused rules: {counts['disabled_rules']}")
+            
+            # Compare with expected
+            actual = AnalysisCounts(
+                duplicate_objects=len(duplicate_objects),
+                duplicate_rules=len(duplicate_rules),
+                unused_objects=len(unused_objects),
+                unused_rules=counts['disabled_rules'],
+            )
+            
+            print(f"\n🎯 Manual Analysis vs Expected:")
+            all_match = actual == EXPECTED_COUNTS
+            for key, expected_val, actual_val in zip(AnalysisCounts._fields, EXPECTED_COUNTS, actual):
+                status = "✅" if all_match or actual_val == expected_val else "❌"
+                print(f"   {key}: Expected={expected_val}, Manual={actual_val} {status}")
         
         return actual
         
@@ -152,27 +201,27 @@ def identify_analysis_issues(manual_results):
     print(f"\n🔧 ANALYSIS ISSUES IDENTIFIED:")
     print("=" * 40)
     
-    if manual_results['duplicate_objects'] > 0:
+    if manual_results.duplicate_objects > 0:
         print(f"1. **Duplicate Object Detection Broken:**")
-        print(f"   - Manual analysis finds {manual_results['duplicate_objects']} duplicate objects")
+        print(f"   - Manual analysis finds {manual_results.duplicate_objects} duplicate objects")
         print(f"   - System analysis finds 0 duplicate objects")
         print(f"   - Fix: Check redundant object detection logic")
     
-    if manual_results['duplicate_rules'] > 0:
+    if manual_results.duplicate_rules > 0:
         print(f"\n2. **Duplicate Rule Detection Broken:**")
-        print(f"   - Manual analysis finds {manual_results['duplicate_rules']} duplicate rules")
+        print(f"   - Manual analysis finds {manual_results.duplicate_rules} duplicate rules")
         print(f"   - System analysis finds 0 duplicate rules")
         print(f"   - Fix: Check duplicate rule detection logic")
     
-    if manual_results['unused_objects'] > 0:
+    if manual_results.unused_objects > 0:
         print(f"\n3. **Unused Object Detection Broken:**")
-        print(f"   - Manual analysis finds {manual_results['unused_objects']} unused objects")
+        print(f"   - Manual analysis finds {manual_results.unused_objects} unused objects")
         print(f"   - System analysis finds 0 unused objects")
         print(f"   - Fix: Check object usage analysis logic")
     
-    if manual_results['unused_rules'] > 0:
+    if manual_results.unused_rules > 0:
         print(f"\n4. **Unused Rule Detection Broken:**")
-        print(f"   - Manual analysis finds {manual_results['unused_rules']} unused rules")
+        print(f"   - Manual analysis finds {manual_results.unused_rules} unused rules")
         print(f"   - System analysis finds 0 unused rules")
         print(f"   - Fix: Check unused rule detection logic")
     
@@ -182,6 +231,8 @@ def identify_analysis_issues(manual_results):
     print(f"   This is the opposite of the previous over-aggressive problem")
 
 if __name__ == "__main__":
+    buffer_stdout()
+    
     print("🚀 DEBUGGING ANALYSIS LOGIC")
     print("=" * 60)
     
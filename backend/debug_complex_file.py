@@ -3,29 +3,85 @@
 Debug the complex file upload to understand parsing discrepancies.
 """
 
-import requests
 import sqlite3
-import json
+import sys
+from itertools import groupby
+from operator import itemgetter
+from typing import NamedTuple
 
-def debug_recent_upload():
-    """Debug the most recent upload to understand parsing issues."""
+from db_pool import read_conn, write_conn
+from diagnostic_utils import API_BASE_URL, buffer_stdout, ensure_indexes, http_session, latest_audit, loads_json
+
+# Rule totals and per-type object totals for one audit in one round trip:
+# one row per object type, or a single row with a NULL type when the audit has
+# no objects
+SQL_AUDIT_SUMMARY = """
+    WITH r AS (
+        SELECT COUNT(*) AS total,
+               COUNT(CASE WHEN is_disabled THEN 1 END) AS disabled
+        FROM firewall_rules
+        WHERE audit_id = :audit_id
+    ),
+    o AS (
+        SELECT object_type,
+               COUNT(*) AS total,
+               COUNT(CASE WHEN used_in_rules > 0 THEN 1 END) AS used,
+               COUNT(CASE WHEN used_in_rules = 0 THEN 1 END) AS unused
+        FROM object_definitions
+        WHERE audit_id = :audit_id
+        GROUP BY object_type
+    )
+    SELECT r.total AS total_rules, r.disabled AS disabled_rules,
+           o.object_type, o.total AS object_count, o.used AS used_count, o.unused AS unused_count
+    FROM r LEFT JOIN o ON 1
+    ORDER BY o.object_type
+"""
+SQL_SAMPLE_RULES = """
+    SELECT rule_name, rule_type, src_zone, dst_zone, src, dst, service, action, position, is_disabled
+    FROM firewall_rules 
+    WHERE audit_id = ?
+    ORDER BY position
+    LIMIT 10
+"""
+SQL_LISTED_OBJECTS = """
+    SELECT name, object_type, value,
+           CASE WHEN used_in_rules > 0 THEN 'Used in ' || used_in_rules || ' rules' ELSE 'UNUSED' END AS usage
+    FROM object_definitions 
+    WHERE audit_id = ? AND object_type IN ('address', 'service')
+    ORDER BY object_type, name
+"""
+
+class UploadCounts(NamedTuple):
+    """Object and rule counts compared against the complex test file's breakdown."""
+    total_address_objects: int
+    unused_address_objects: int
+    total_security_policies: int
+
+# Expected breakdown of the complex test file, with the label printed for each field
+EXPECTED_COUNTS = UploadCounts(total_address_objects=17, unused_address_objects=2, total_security_policies=17)
+COUNT_LABELS = UploadCounts("Total Address Objects", "Unused Address Objects", "Total Security Policies")
+
+# Per-line listing templates; rows are sqlite3.Row objects indexed by column name
+SAMPLE_RULE_LINE = "   {0}. {1[rule_name]} | {1[src]} → {1[dst]} | {1[service]} | {1[action]} ({2})\n".format
+OBJECT_LINE = "      {0}. {1[name]} = {1[value]} | {1[usage]}\n".format
+API_OBJECT_LINE = "   {0}. {1} ({2}) = {3}\n".format
+
+def debug_recent_upload(verbose=True):
+    """Debug the most recent upload to understand parsing issues.
+
+    With verbose=False only aggregate counts are read from the database; the
+    sample rules and the full object listing are skipped.
+    """
     
     print("🔍 DEBUGGING COMPLEX FILE UPLOAD")
     print("=" * 50)
     
     try:
-        # Get the most recent audit
-        conn = sqlite3.connect('firewall_tool.db')
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT id, session_name, filename, start_time 
-            FROM audit_sessions 
-            ORDER BY id DESC 
-            LIMIT 1
-        """)
+        with write_conn() as conn:
+            ensure_indexes(conn)
         
-        audit = cursor.fetchone()
+        # Get the most recent audit (cached until the database changes)
+        audit = latest_audit()
         if not audit:
             print("❌ No audit sessions found")
             return
@@ -37,94 +93,73 @@ def debug_recent_upload():
         print(f"   File: {filename}")
         print(f"   Time: {start_time}")
         
-        # Get detailed rule information
-        cursor.execute("""
-            SELECT COUNT(*) FROM firewall_rules WHERE audit_id = ?
-        """, (audit_id,))
-        total_rules = cursor.fetchone()[0]
-        
-        cursor.execute("""
-            SELECT rule_name, rule_type, src_zone, dst_zone, src, dst, service, action, position, is_disabled
-            FROM firewall_rules 
-            WHERE audit_id = ?
-            ORDER BY position
-        """, (audit_id,))
-        rules = cursor.fetchall()
-        
-        print(f"\n📊 Rules Analysis:")
-        print(f"   Total Rules Found: {total_rules}")
-        
-        if rules:
-            enabled_rules = [r for r in rules if not r[9]]
-            disabled_rules = [r for r in rules if r[9]]
+        with read_conn() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
             
-            print(f"   Enabled Rules: {len(enabled_rules)}")
-            print(f"   Disabled Rules: {len(disabled_rules)}")
+            # Rule totals and per-type object totals in one query
+            summary_rows = cursor.execute(SQL_AUDIT_SUMMARY, {'audit_id': audit_id}).fetchall()
+            total_rules = summary_rows[0]['total_rules']
+            disabled_rules = summary_rows[0]['disabled_rules']
             
-            print(f"\n📋 Sample Rules:")
-            for i, rule in enumerate(rules[:10]):
-                status = "DISABLED" if rule[9] else "ENABLED"
-                print(f"   {i+1}. {rule[0]} | {rule[4]} → {rule[5]} | {rule[6]} | {rule[7]} ({status})")
-        
-        # Get detailed object information
-        cursor.execute("""
-            SELECT COUNT(*) FROM object_definitions WHERE audit_id = ?
-        """, (audit_id,))
-        total_objects = cursor.fetchone()[0]
-        
-        cursor.execute("""
-            SELECT object_type, COUNT(*) 
-            FROM object_definitions 
-            WHERE audit_id = ?
-            GROUP BY object_type
-        """, (audit_id,))
-        object_counts = cursor.fetchall()
-        
-        cursor.execute("""
-            SELECT name, object_type, value, used_in_rules
-            FROM object_definitions 
-            WHERE audit_id = ?
-            ORDER BY object_type, name
-        """, (audit_id,))
-        objects = cursor.fetchall()
-        
-        print(f"\n📦 Objects Analysis:")
-        print(f"   Total Objects Found: {total_objects}")
-        
-        for obj_type, count in object_counts:
-            print(f"   {obj_type.title()} Objects: {count}")
-        
-        # Analyze object usage
-        used_objects = [obj for obj in objects if obj[3] > 0]
-        unused_objects = [obj for obj in objects if obj[3] == 0]
-        
-        print(f"   Used Objects: {len(used_objects)}")
-        print(f"   Unused Objects: {len(unused_objects)}")
-        
-        # Show all objects with usage
-        print(f"\n📋 All Objects:")
-        address_objects = [obj for obj in objects if obj[1] == 'address']
-        service_objects = [obj for obj in objects if obj[1] == 'service']
-        
-        print(f"   Address Objects ({len(address_objects)}):")
-        for i, obj in enumerate(address_objects):
-            usage = f"Used in {obj[3]} rules" if obj[3] > 0 else "UNUSED"
-            print(f"      {i+1}. {obj[0]} = {obj[2]} | {usage}")
-        
-        if service_objects:
-            print(f"   Service Objects ({len(service_objects)}):")
-            for i, obj in enumerate(service_objects):
-                usage = f"Used in {obj[3]} rules" if obj[3] > 0 else "UNUSED"
-                print(f"      {i+1}. {obj[0]} = {obj[2]} | {usage}")
-        
-        conn.close()
+            print(f"\n📊 Rules Analysis:")
+            print(f"   Total Rules Found: {total_rules}")
+            
+            if total_rules:
+                print(f"   Enabled Rules: {total_rules - disabled_rules}")
+                print(f"   Disabled Rules: {disabled_rules}")
+                
+                if verbose:
+                    cursor.execute(SQL_SAMPLE_RULES, (audit_id,))
+                    
+                    print(f"\n📋 Sample Rules:")
+                    sys.stdout.writelines(
+                        SAMPLE_RULE_LINE(i, rule, "DISABLED" if rule['is_disabled'] else "ENABLED")
+                        for i, rule in enumerate(cursor, 1)
+                    )
+            
+            # One pass over the per-type rows for the overall totals and the
+            # (total, unused) per type used by the listing headers and the API comparison
+            total_objects = used_objects = unused_objects = 0
+            type_counts = {}
+            for row in summary_rows:
+                if row['object_type'] is None:
+                    continue
+                total_objects += row['object_count']
+                used_objects += row['used_count']
+                unused_objects += row['unused_count']
+                type_counts[row['object_type']] = (row['object_count'], row['unused_count'])
+            
+            print(f"\n📦 Objects Analysis:")
+            print(f"   Total Objects Found: {total_objects}")
+            
+            for obj_type, (count, unused_count) in type_counts.items():
+                print(f"   {obj_type.title()} Objects: {count}")
+            
+            # Analyze object usage
+            print(f"   Used Objects: {used_objects}")
+            print(f"   Unused Objects: {unused_objects}")
+            
+            address_total, address_unused = type_counts.get('address', (0, 0))
+            
+            if verbose:
+                cursor.execute(SQL_LISTED_OBJECTS, (audit_id,))
+                
+                # Show all objects with usage, streamed from the cursor; rows
+                # arrive grouped by type, one listing section per type
+                print(f"\n📋 All Objects:")
+                print(f"   Address Objects ({address_total}):")
+                for obj_type, objects in groupby(cursor, itemgetter('object_type')):
+                    if obj_type != 'address':
+                        print(f"   Service Objects ({type_counts[obj_type][0]}):")
+                    sys.stdout.writelines(OBJECT_LINE(i, obj) for i, obj in enumerate(objects, 1))
         
         # Get API analysis results
         print(f"\n🌐 API Analysis Results:")
         try:
-            response = requests.get(f'http://127.0.0.1:8000/api/v1/audits/{audit_id}/analysis')
+            response = http_session().get(f'{API_BASE_URL}/audits/{audit_id}/analysis', timeout=5)
             if response.status_code == 200:
-                data = response.json()['data']
+                data = loads_json(response.content)['data']
                 summary = data['analysis_summary']
                 
                 print(f"📈 API Summary:")
@@ -151,22 +186,19 @@ def debug_recent_upload():
                 unused_objects_api = data.get('unusedObjects', [])
                 if unused_objects_api:
                     print(f"\n📦 Unused Objects from API:")
-                    for i, obj in enumerate(unused_objects_api):
-                        print(f"   {i+1}. {obj.get('name', 'N/A')} ({obj.get('type', 'N/A')}) = {obj.get('value', 'N/A')}")
+                    sys.stdout.writelines(
+                        API_OBJECT_LINE(i, obj.get('name', 'N/A'), obj.get('type', 'N/A'), obj.get('value', 'N/A'))
+                        for i, obj in enumerate(unused_objects_api, 1)
+                    )
                 
                 # Compare with expected values
                 print(f"\n🎯 Expected vs Actual Comparison:")
-                expected = {
-                    "Total Address Objects": 17,
-                    "Unused Address Objects": 2,
-                    "Total Security Policies": 17
-                }
-                
-                actual = {
-                    "Total Address Objects": len(address_objects),
-                    "Unused Address Objects": len([obj for obj in address_objects if obj[3] == 0]),
-                    "Total Security Policies": summary['total_rules']
-                }
+                expected = EXPECTED_COUNTS
+                actual = UploadCounts(
+                    total_address_objects=address_total,
+                    unused_address_objects=address_unused,
+                    total_security_policies=summary['total_rules'],
+                )
                 
                 print(f"   Expected breakdown:")
                 print(f"      Total Address Objects: 17 (12 original + 5 redundant)")
@@ -174,30 +206,32 @@ def debug_recent_upload():
                 print(f"      Total Security Policies: 17 (10 original + 5 redundant + 2 duplicate)")
                 
                 print(f"   Actual results:")
-                for key in expected:
-                    expected_val = expected[key]
-                    actual_val = actual[key]
-                    status = "✅" if actual_val == expected_val else "❌"
-                    print(f"      {key}: Expected={expected_val}, Actual={actual_val} {status}")
+                all_match = actual == expected
+                for label, expected_val, actual_val in zip(COUNT_LABELS, expected, actual):
+                    status = "✅" if all_match or actual_val == expected_val else "❌"
+                    print(f"      {label}: Expected={expected_val}, Actual={actual_val} {status}")
                 
                 # Identify specific discrepancies
                 print(f"\n🔍 Discrepancy Analysis:")
                 
-                if actual["Total Address Objects"] != expected["Total Address Objects"]:
+                if all_match:
+                    return audit_id
+                
+                if actual.total_address_objects != expected.total_address_objects:
                     print(f"   📦 Address Objects Mismatch:")
-                    print(f"      Expected 17 address objects, found {actual['Total Address Objects']}")
+                    print(f"      Expected 17 address objects, found {actual.total_address_objects}")
                     print(f"      This suggests the XML structure might be different than expected")
                     print(f"      Check if objects are in a different location or format")
                 
-                if actual["Unused Address Objects"] != expected["Unused Address Objects"]:
+                if actual.unused_address_objects != expected.unused_address_objects:
                     print(f"   🔍 Unused Objects Mismatch:")
                     print(f"      Expected 2 unused objects (Backup-Server-01, Monitoring-Host-01)")
-                    print(f"      Found {actual['Unused Address Objects']} unused objects")
+                    print(f"      Found {actual.unused_address_objects} unused objects")
                     print(f"      Check object names and rule references")
                 
-                if actual["Total Security Policies"] != expected["Total Security Policies"]:
+                if actual.total_security_policies != expected.total_security_policies:
                     print(f"   📋 Rules Mismatch:")
-                    print(f"      Expected 17 security policies, found {actual['Total Security Policies']}")
+                    print(f"      Expected 17 security policies, found {actual.total_security_policies}")
                     print(f"      This suggests rules might be in a different XML section")
                     print(f"      Check if rules are in NAT, QoS, or other sections")
                 
@@ -242,6 +276,8 @@ def suggest_fixes():
     print(f"   - Check for XML namespaces or attributes")
 
 if __name__ == "__main__":
+    buffer_stdout()
+    
     audit_id = debug_recent_upload()
     
     if audit_id:
@@ -3,14 +3,30 @@
 Debug the incremental parsing function directly to see why it's not working.
 """
 
-def test_incremental_function_directly():
-    """Test the incremental parsing function directly."""
+import re
+import sys
+
+# Same patterns parse_incremental_set_rule uses, compiled once for the per-line loop
+RULE_NAME_RE = re.compile(r'set (?:rulebase )?security rules ["\']?([^"\']+?)["\']?\s+(?:from|to|source|destination|service|action|application)')
+RULE_NAME_FALLBACK_RE = re.compile(r'set (?:rulebase )?security rules ["\']?([^"\']+)["\']?')
+# First whitespace-delimited attribute keyword in a fallback name; the rule name ends before it
+ATTRIBUTE_KEYWORD_RE = re.compile(r'\s+(from|to|source|destination|service|action|application)(?=\s|$)')
+
+# Per-rule state line printed after each processed set command
+RULE_STATE_LINE = "      '{0}': {1[src_zone]} → {1[dst_zone]} | {1[src]} → {1[dst]} | {1[service]} | {1[action]}\n".format
+
+def test_incremental_function_directly(verbose=True):
+    """Test the incremental parsing function directly.
+
+    With verbose=False the rules dict is not dumped after every processed
+    line; only the final consolidated result is shown.
+    """
     
     print("🔍 TESTING INCREMENTAL FUNCTION DIRECTLY")
     print("=" * 50)
     
     try:
-        from src.utils.parse_config import parse_incremental_set_rule
+        from src.utils.parse_config import parse_incremental_set_rule, parse_incremental_set_rules
         
         # Test with a simple case
         rules_dict = {}
@@ -25,17 +41,22 @@ def test_incremental_function_directly():
         ]
         
         print(f"📋 Test Lines:")
-        for i, line in enumerate(test_lines):
-            print(f"   {i+1}. {line}")
+        sys.stdout.writelines(f"   {i}. {line}\n" for i, line in enumerate(test_lines, 1))
         
         print(f"\n🧪 Processing with parse_incremental_set_rule...")
         
-        for line in test_lines:
-            print(f"\n   Processing: {line}")
-            parse_incremental_set_rule(line, rules_dict)
-            print(f"   Rules dict now has {len(rules_dict)} rules")
-            for name, rule_data in rules_dict.items():
-                print(f"      '{name}': {rule_data['src_zone']} → {rule_data['dst_zone']} | {rule_data['src']} → {rule_data['dst']} | {rule_data['service']} | {rule_data['action']}")
+        if verbose:
+            # The per-line trace needs the rules dict after every line; it is
+            # collected and written once after the loop
+            out = []
+            for line in test_lines:
+                parse_incremental_set_rule(line, rules_dict)
+                out.append(f"\n   Processing: {line}\n")
+                out.append(f"   Rules dict now has {len(rules_dict)} rules\n")
+                out.extend(RULE_STATE_LINE(name, rule_data) for name, rule_data in rules_dict.items())
+            sys.stdout.writelines(out)
+        else:
+            parse_incremental_set_rules(test_lines, rules_dict)
         
         print(f"\n📊 Final Results:")
         print(f"   Rules created: {len(rules_dict)}")
@@ -75,13 +96,11 @@ def test_rule_name_extraction():
     ]
     
     try:
-        import re
-        
         for line in test_cases:
             print(f"\n   Line: {line}")
             
             # Test the regex pattern from the function
-            name_match = re.search(r'set (?:rulebase )?security rules ["\']?([^"\']+?)["\']?\s+(?:from|to|source|destination|service|action|application)', line)
+            name_match = RULE_NAME_RE.search(line)
             if name_match:
                 rule_name = name_match.group(1).strip()
                 print(f"   ✅ Extracted name: '{rule_name}'")
@@ -89,19 +108,16 @@ def test_rule_name_extraction():
                 print(f"   ❌ Failed to extract name with primary regex")
                 
                 # Try fallback
-                name_match = re.search(r'set (?:rulebase )?security rules ["\']?([^"\']+)["\']?', line)
+                name_match = RULE_NAME_FALLBACK_RE.search(line)
                 if name_match:
                     full_name = name_match.group(1).strip()
                     print(f"   Fallback full name: '{full_name}'")
                     
-                    # Clean the rule name by removing attribute keywords
-                    attribute_keywords = ['from', 'to', 'source', 'destination', 'service', 'action', 'application']
-                    rule_name = full_name
-                    for keyword in attribute_keywords:
-                        if ' ' + keyword + ' ' in ' ' + full_name + ' ':
-                            rule_name = full_name.split(' ' + keyword)[0].strip()
-                            print(f"   ✅ Cleaned name: '{rule_name}' (removed '{keyword}')")
-                            break
+                    # Clean the rule name by cutting it at the first attribute keyword
+                    keyword_match = ATTRIBUTE_KEYWORD_RE.search(full_name)
+                    if keyword_match:
+                        rule_name = full_name[:keyword_match.start()].strip()
+                        print(f"   ✅ Cleaned name: '{rule_name}' (removed '{keyword_match.group(1)}')")
                 else:
                     print(f"   ❌ Failed to extract name with fallback regex")
         
@@ -3,6 +3,29 @@
 Debug why the incremental parsing is not working.
 """
 
+import io
+import sqlite3
+import sys
+
+from db_pool import read_conn, write_conn
+from diagnostic_utils import ensure_indexes, latest_audit
+
+SQL_SAMPLE_RULES = """
+    SELECT rule_name, src_zone, dst_zone, src, dst, service, action,
+           substr(raw_xml, 1, 100) AS raw_prefix
+    FROM firewall_rules
+    WHERE audit_id = ?
+    ORDER BY position
+    LIMIT 10
+"""
+SQL_RULE_NAME_COUNTS = """
+    SELECT rule_name, COUNT(*) AS copies
+    FROM firewall_rules
+    WHERE audit_id = ?
+    GROUP BY rule_name
+    ORDER BY copies DESC, rule_name
+"""
+
 def test_incremental_parsing_directly():
     """Test the incremental parsing function directly."""
     
@@ -31,10 +54,12 @@ set security rules "Allow-DB-Access" service service-mysql
 set security rules "Allow-DB-Access" action allow"""
         
         print(f"📋 Test Content:")
-        lines = test_content.split('\n')
-        for i, line in enumerate(lines):
-            if line.strip():
-                print(f"   {i+1:2d}. {line}")
+        # Streamed line by line; the config is never split into a list
+        sys.stdout.writelines(
+            f"   {i:2d}. {line.rstrip()}\n"
+            for i, line in enumerate(io.StringIO(test_content), 1)
+            if line.strip()
+        )
         
         print(f"\n🧪 Calling parse_set_config...")
         rules_data, objects_data, metadata = parse_set_config(test_content)
@@ -81,25 +106,17 @@ def debug_why_not_working():
     print("=" * 60)
     
     try:
-        import sqlite3
+        # idx_rules_audit_pos turns the sample query's ORDER BY position into an index range scan
+        with write_conn() as conn:
+            ensure_indexes(conn)
         
         # Get the most recent audit
-        conn = sqlite3.connect('firewall_tool.db')
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT id, session_name, filename 
-            FROM audit_sessions 
-            ORDER BY id DESC 
-            LIMIT 1
-        """)
-        
-        audit = cursor.fetchone()
+        audit = latest_audit()
         if not audit:
             print("❌ No audit sessions found")
             return
         
-        audit_id, session_name, filename = audit
+        audit_id, session_name, filename, _ = audit
         print(f"📋 Most Recent Audit:")
         print(f"   ID: {audit_id}")
         print(f"   Session: {session_name}")
@@ -111,49 +128,42 @@ def debug_why_not_working():
             print(f"   The issue might be with a different file format")
             return
         
-        # Get sample rules to see the pattern
-        cursor.execute("""
-            SELECT rule_name, src_zone, dst_zone, src, dst, service, action, raw_xml
-            FROM firewall_rules 
-            WHERE audit_id = ?
-            ORDER BY position
-            LIMIT 10
-        """, (audit_id,))
-        
-        rules = cursor.fetchall()
-        
-        print(f"\n📋 Sample Rules from Database:")
-        for i, rule in enumerate(rules):
-            rule_name, src_zone, dst_zone, src, dst, service, action, raw_xml = rule
-            print(f"   {i+1}. {rule_name}")
-            print(f"      Zones: {src_zone} → {dst_zone}")
-            print(f"      Objects: {src} → {dst}")
-            print(f"      Service: {service}")
-            print(f"      Action: {action}")
-            print(f"      Raw: {raw_xml[:100]}...")
-            print()
-        
-        conn.close()
-        
-        # Check if rules have the same name but different attributes
-        rule_names = [rule[0] for rule in rules]
-        unique_names = set(rule_names)
+        with read_conn() as conn:
+            conn.row_factory = sqlite3.Row
+            
+            # Get sample rules to see the pattern; only the printed prefix of raw_xml is read
+            rules = conn.execute(SQL_SAMPLE_RULES, (audit_id,)).fetchall()
+            
+            print(f"\n📋 Sample Rules from Database:")
+            for i, rule in enumerate(rules):
+                print(f"   {i+1}. {rule['rule_name']}")
+                print(f"      Zones: {rule['src_zone']} → {rule['dst_zone']}")
+                print(f"      Objects: {rule['src']} → {rule['dst']}")
+                print(f"      Service: {rule['service']}")
+                print(f"      Action: {rule['action']}")
+                print(f"      Raw: {rule['raw_prefix']}...")
+                print()
+            
+            # Check if rules have the same name but different attributes, over
+            # the whole audit rather than the sample; most repeated names first
+            name_counts = conn.execute(SQL_RULE_NAME_COUNTS, (audit_id,)).fetchall()
+        
+        total_rules = sum(row['copies'] for row in name_counts)
         
         print(f"📊 Rule Name Analysis:")
-        print(f"   Total rules: {len(rules)}")
-        print(f"   Unique rule names: {len(unique_names)}")
-        print(f"   Unique names: {list(unique_names)[:5]}")
+        print(f"   Total rules: {total_rules}")
+        print(f"   Unique rule names: {len(name_counts)}")
+        print(f"   Unique names: {[row['rule_name'] for row in name_counts[:5]]}")
         
-        if len(unique_names) < len(rules):
+        if len(name_counts) < total_rules:
             print(f"\n🚨 PROBLEM IDENTIFIED:")
             print(f"   Multiple rules with same name found!")
             print(f"   This means incremental parsing is NOT consolidating rules")
             print(f"   Each set command is still being stored as a separate rule")
             
             # Check for specific rule name patterns
-            for name in list(unique_names)[:3]:
-                count = rule_names.count(name)
-                print(f"   '{name}': {count} rules")
+            for name, copies in name_counts[:3]:
+                print(f"   '{name}': {copies} rules")
         else:
             print(f"\n✅ Rule names are unique")
             print(f"   But we still have too many rules total")
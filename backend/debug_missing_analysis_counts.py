@@ -3,8 +3,11 @@
 Debug why set command outputs show no analysis counts and XML outputs miss shadowed/duplicate rules.
 """
 
-import requests
-import sqlite3
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from db_pool import read_conn, write_conn
+from diagnostic_utils import API_BASE_URL, ensure_indexes, get_json_cached, load_audit_counts, set_disk_cache
 
 def debug_missing_analysis_counts():
     """Debug missing analysis counts for both set and XML formats."""
@@ -13,45 +16,54 @@ def debug_missing_analysis_counts():
     print("=" * 50)
     
     try:
-        # Get recent audits to compare set vs XML
-        conn = sqlite3.connect('firewall_tool.db')
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT id, session_name, filename 
-            FROM audit_sessions 
-            ORDER BY id DESC 
-            LIMIT 5
-        """)
-        
-        audits = cursor.fetchall()
-        
-        print(f"📋 Recent Audits:")
-        for audit_id, session_name, filename in audits:
-            file_type = "XML" if filename.endswith('.xml') else "SET"
-            print(f"   {audit_id}: {filename} ({file_type})")
-        
-        # Test both a set format and XML format audit
-        set_audit = None
-        xml_audit = None
+        with write_conn() as conn:
+            ensure_indexes(conn)
         
-        for audit_id, session_name, filename in audits:
-            if filename.endswith('.xml') and xml_audit is None:
-                xml_audit = audit_id
-            elif filename.endswith('.txt') and set_audit is None:
-                set_audit = audit_id
+        with read_conn() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                SELECT id, session_name, filename 
+                FROM audit_sessions 
+                ORDER BY id DESC 
+                LIMIT 5
+            """)
+            
+            audits = cursor.fetchall()
+            
+            print(f"📋 Recent Audits:")
+            for audit_id, session_name, filename in audits:
+                file_type = "XML" if filename.endswith('.xml') else "SET"
+                print(f"   {audit_id}: {filename} ({file_type})")
+            
+            # Test both a set format and XML format audit
+            set_audit = None
+            xml_audit = None
+            
+            for audit_id, session_name, filename in audits:
+                if filename.endswith('.xml') and xml_audit is None:
+                    xml_audit = audit_id
+                elif filename.endswith('.txt') and set_audit is None:
+                    set_audit = audit_id
         
-        conn.close()
+        # Fetch each audit's analysis and rule counts in its own worker so the
+        # SET and XML checks overlap; reports are still printed in order below
+        executor = ThreadPoolExecutor(max_workers=2)
+        analysis_futures = {
+            audit_id: executor.submit(fetch_analysis_counts, audit_id)
+            for audit_id in (set_audit, xml_audit) if audit_id
+        }
+        executor.shutdown(wait=False)
         
         # Test SET format analysis
         if set_audit:
             print(f"\n🔧 Testing SET Format Analysis (Audit {set_audit}):")
-            test_analysis_counts(set_audit, "SET")
+            test_analysis_counts(set_audit, "SET", analysis_futures[set_audit])
         
         # Test XML format analysis
         if xml_audit:
             print(f"\n📄 Testing XML Format Analysis (Audit {xml_audit}):")
-            test_analysis_counts(xml_audit, "XML")
+            test_analysis_counts(xml_audit, "XML", analysis_futures[xml_audit])
         
         return True
         
@@ -59,15 +71,31 @@ def debug_missing_analysis_counts():
         print(f"❌ Debug failed: {str(e)}")
         return False
 
-def test_analysis_counts(audit_id, format_type):
-    """Test analysis counts for a specific audit."""
+def fetch_analysis_counts(audit_id):
+    """Fetch an audit's analysis and its database counts.
+
+    Returns (status_code, payload, counts): the get_json_cached result for the
+    analysis endpoint and load_audit_counts for the audit. Safe to run in a
+    worker thread; the counts are read through a connection of its own.
+    """
+    status_code, payload = get_json_cached(f'{API_BASE_URL}/audits/{audit_id}/analysis')
+    with read_conn() as conn:
+        counts = load_audit_counts(conn, audit_id)
+    return status_code, payload, counts
+
+def test_analysis_counts(audit_id, format_type, analysis_future):
+    """Test analysis counts for a specific audit.
+
+    analysis_future resolves to the (status_code, payload, counts) triple from
+    fetch_analysis_counts for the audit.
+    """
     
     try:
         # Get analysis results
-        analysis_response = requests.get(f'http://127.0.0.1:8000/api/v1/audits/{audit_id}/analysis')
+        status_code, payload, counts = analysis_future.result()
         
-        if analysis_response.status_code == 200:
-            analysis_data = analysis_response.json()['data']
+        if status_code == 200:
+            analysis_data = payload['data']
             summary = analysis_data['analysis_summary']
             
             print(f"   📊 {format_type} Analysis Summary:")
@@ -125,19 +153,10 @@ def test_analysis_counts(audit_id, format_type):
             # Check if rule analysis is being called
             print(f"   🔍 {format_type} Rule Analysis Check:")
             
-            # Get rules from database to see if analysis should find issues
-            conn = sqlite3.connect('firewall_tool.db')
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT COUNT(*) FROM firewall_rules WHERE audit_id = ?
-            """, (audit_id,))
-            rule_count = cursor.fetchone()[0]
-            
-            cursor.execute("""
-                SELECT COUNT(*) FROM firewall_rules WHERE audit_id = ? AND is_disabled = 1
-            """, (audit_id,))
-            disabled_count = cursor.fetchone()[0]
+            # Rules in the database show whether analysis should find issues;
+            # both totals come from one aggregate query
+            rule_count = counts['rules']
+            disabled_count = counts['disabled_rules']
             
             print(f"      Total rules in DB: {rule_count}")
             print(f"      Disabled rules in DB: {disabled_count}")
@@ -145,10 +164,8 @@ def test_analysis_counts(audit_id, format_type):
             if rule_count > 0 and len(working_categories) == 0:
                 print(f"      🚨 ANALYSIS PIPELINE BROKEN: Rules exist but no analysis results")
             
-            conn.close()
-            
         else:
-            print(f"   ❌ {format_type} Analysis request failed: {analysis_response.status_code}")
+            print(f"   ❌ {format_type} Analysis request failed: {status_code}")
             
     except Exception as e:
         print(f"   ❌ {format_type} Analysis test failed: {str(e)}")
@@ -180,6 +197,11 @@ def suggest_fixes():
     print(f"   - Verify frontend data processing")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--no-cache', action='store_true',
+                        help='ignore responses cached on disk by earlier runs')
+    set_disk_cache(not parser.parse_args().no_cache)
+    
     print("🚀 DEBUGGING MISSING ANALYSIS COUNTS")
     print("=" * 60)
     
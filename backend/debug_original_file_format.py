@@ -3,7 +3,16 @@
 Debug the original file format to understand why it's creating 119 rules.
 """
 
-import sqlite3
+import re
+import sys
+from collections import Counter
+
+from db_pool import read_snapshot, write_conn
+from diagnostic_utils import ensure_indexes
+
+# An attribute keyword standing as its own word inside a rule name, e.g. the
+# "from" in "Allow-Web-Access from trust"; matched case-insensitively in one scan
+ATTRIBUTE_KEYWORD_RE = re.compile(r'(?<!\S)(from|to|source|destination|service|action)(?=\s)', re.IGNORECASE)
 
 def debug_original_file_format():
     """Debug the original file format."""
@@ -12,85 +21,85 @@ def debug_original_file_format():
     print("=" * 50)
     
     try:
-        # Get the audit with the original file
-        conn = sqlite3.connect('firewall_tool.db')
-        cursor = conn.cursor()
-        
-        # Look for the original complex file
-        cursor.execute("""
-            SELECT id, session_name, filename 
-            FROM audit_sessions 
-            WHERE filename LIKE '%sample3%' OR session_name LIKE '%sample3%'
-            ORDER BY id DESC 
-            LIMIT 1
-        """)
-        
-        audit = cursor.fetchone()
-        if not audit:
-            print("❌ Original file audit not found")
-            return
-        
-        audit_id, session_name, filename = audit
-        print(f"📋 Original File Audit:")
-        print(f"   ID: {audit_id}")
-        print(f"   Session: {session_name}")
-        print(f"   File: {filename}")
-        
-        # Get sample rules to understand the pattern
-        cursor.execute("""
-            SELECT rule_name, src_zone, dst_zone, src, dst, service, action, raw_xml
-            FROM firewall_rules 
-            WHERE audit_id = ?
-            ORDER BY position
-            LIMIT 20
-        """, (audit_id,))
-        
-        rules = cursor.fetchall()
+        with write_conn() as conn:
+            ensure_indexes(conn)
+        
+        # Both queries read one snapshot on a pooled connection that is
+        # released before the analysis below
+        with read_snapshot() as conn:
+            cursor = conn.cursor()
+            
+            # Look for the original complex file
+            cursor.execute("""
+                SELECT id, session_name, filename 
+                FROM audit_sessions 
+                WHERE filename LIKE '%sample3%' OR session_name LIKE '%sample3%'
+                ORDER BY id DESC 
+                LIMIT 1
+            """)
+        
+            audit = cursor.fetchone()
+            if not audit:
+                print("❌ Original file audit not found")
+                return
+        
+            audit_id, session_name, filename = audit
+            print(f"📋 Original File Audit:")
+            print(f"   ID: {audit_id}")
+            print(f"   Session: {session_name}")
+            print(f"   File: {filename}")
+        
+            # Get sample rules to understand the pattern
+            cursor.execute("""
+                SELECT rule_name, src_zone, dst_zone, src, dst, service, action, raw_xml
+                FROM firewall_rules 
+                WHERE audit_id = ?
+                ORDER BY position
+                LIMIT 20
+            """, (audit_id,))
+        
+            rules = cursor.fetchall()
         
         print(f"\n📋 Sample Rules from Original File:")
         print(f"   Total rules in database: {len(rules)} (showing first 20)")
         
-        for i, rule in enumerate(rules):
+        # Per-rule listings are collected and written in one call per section
+        out = []
+        for i, rule in enumerate(rules, 1):
             rule_name, src_zone, dst_zone, src, dst, service, action, raw_xml = rule
-            print(f"\n   {i+1:2d}. Rule Name: '{rule_name}'")
-            print(f"       Zones: {src_zone} → {dst_zone}")
-            print(f"       Objects: {src} → {dst}")
-            print(f"       Service: {service}")
-            print(f"       Action: {action}")
-            print(f"       Raw: {raw_xml[:150]}...")
+            out.append(f"\n   {i:2d}. Rule Name: '{rule_name}'\n"
+                       f"       Zones: {src_zone} → {dst_zone}\n"
+                       f"       Objects: {src} → {dst}\n"
+                       f"       Service: {service}\n"
+                       f"       Action: {action}\n"
+                       f"       Raw: {raw_xml[:150]}...\n")
+        sys.stdout.writelines(out)
         
         # Analyze the raw_xml patterns
         print(f"\n🔍 Raw Command Analysis:")
-        raw_commands = [rule[7] for rule in rules[:10]]
-        
-        for i, raw in enumerate(raw_commands):
-            print(f"   {i+1}. {raw}")
+        sys.stdout.writelines(f"   {i}. {rule[7]}\n" for i, rule in enumerate(rules[:10], 1))
         
         # Check if these are individual set commands or complete rules
         print(f"\n📊 Pattern Analysis:")
         
-        # Count how many rules have the same base name
+        # Count how many rules have the same base name; most_common picks the
+        # ten most frequent names with a heap (ties keep first-seen order)
         rule_names = [rule[0] for rule in rules]
-        from collections import Counter
         name_counts = Counter(rule_names)
         
         print(f"   Rule name frequency:")
-        for name, count in list(name_counts.items())[:10]:
-            print(f"      '{name}': {count} occurrences")
+        sys.stdout.writelines(f"      '{name}': {count} occurrences\n" for name, count in name_counts.most_common(10))
         
         # Check if rule names contain attribute descriptions
-        attribute_patterns = ['from ', 'to ', 'source ', 'destination ', 'service ', 'action ']
         rules_with_attributes = []
         
         for rule_name in rule_names[:20]:
-            for pattern in attribute_patterns:
-                if pattern in rule_name.lower():
-                    rules_with_attributes.append((rule_name, pattern))
-                    break
+            keyword_match = ATTRIBUTE_KEYWORD_RE.search(rule_name)
+            if keyword_match:
+                rules_with_attributes.append((rule_name, keyword_match.group(1).lower()))
         
         print(f"\n🚨 Rules with attribute patterns in name:")
-        for rule_name, pattern in rules_with_attributes[:10]:
-            print(f"      '{rule_name}' contains '{pattern.strip()}'")
+        sys.stdout.writelines(f"      '{rule_name}' contains '{keyword}'\n" for rule_name, keyword in rules_with_attributes[:10])
         
         # Determine the actual file format
         print(f"\n💡 FILE FORMAT DIAGNOSIS:")
@@ -104,24 +113,22 @@ def debug_original_file_format():
             # Show the consolidation that should happen
             print(f"\n🔧 CONSOLIDATION NEEDED:")
             base_names = set()
-            for name in rule_names:
-                # Extract base rule name (before attribute keywords)
-                base_name = name
-                for pattern in attribute_patterns:
-                    if pattern.strip() in name.lower():
-                        base_name = name.split(pattern.strip())[0].strip()
-                        break
-                base_names.add(base_name)
+            # Each distinct name is scanned once, however often it repeats
+            for name in name_counts:
+                # Extract base rule name (before the first attribute keyword)
+                keyword_match = ATTRIBUTE_KEYWORD_RE.search(name)
+                base_names.add(name[:keyword_match.start()].strip() if keyword_match else name)
+            base_names = list(base_names)
             
             print(f"   Current rules: {len(rules)} individual set commands")
             print(f"   Should be: {len(base_names)} consolidated rules")
-            print(f"   Base rule names: {list(base_names)[:10]}")
+            print(f"   Base rule names: {base_names[:10]}")
             
             return {
                 'format_type': 'incremental_with_names',
                 'total_rules': len(rules),
                 'should_be_rules': len(base_names),
-                'base_names': list(base_names)
+                'base_names': base_names
             }
         else:
             print(f"   ✅ Rule names look normal")
@@ -131,8 +138,6 @@ def debug_original_file_format():
                 'total_rules': len(rules)
             }
         
-        conn.close()
-        
     except Exception as e:
         print(f"❌ Debug failed: {str(e)}")
         return None
@@ -3,7 +3,45 @@
 Debug the rule analysis function to see why it's not working for SET format and missing shadowed/duplicate rules for XML.
 """
 
-import sqlite3
+import logging
+import sys
+from functools import lru_cache
+
+from db_pool import read_snapshot, write_conn
+from diagnostic_utils import db_mtime, ensure_indexes, load_audit_counts
+from src.utils.parse_config import analyze_rule_usage
+
+# Importing parse_config configures the root handlers (src.utils.logging)
+log = logging.getLogger(__name__)
+
+# Rules listed per audit before the "... and N more" line
+SAMPLE_RULE_COUNT = 5
+# Columns of SQL_SAMPLE_RULES, as the header of the tab-separated listing
+SAMPLE_RULE_HEADER = "name\tsrc_zone\tdst_zone\tsrc\tdst\tsvc\taction\tdisabled"
+
+SQL_SAMPLE_RULES = """
+    SELECT rule_name, src_zone, dst_zone, src, dst, service, action, is_disabled
+    FROM firewall_rules
+    WHERE audit_id = ?
+    ORDER BY position
+    LIMIT ?
+"""
+# Every enabled rule after the first with the same (src_zone, dst_zone, src,
+# dst, service, action) signature, paired with that first rule's name, in
+# position order. Partitioning on the columns avoids building a key string
+SQL_DUPLICATE_RULES = """
+    SELECT rule_name, original_name
+    FROM (
+        SELECT rule_name, position,
+               FIRST_VALUE(rule_name) OVER signature AS original_name,
+               ROW_NUMBER() OVER signature AS copy_number
+        FROM firewall_rules
+        WHERE audit_id = ? AND NOT COALESCE(is_disabled, 0)
+        WINDOW signature AS (PARTITION BY src_zone, dst_zone, src, dst, service, action ORDER BY position)
+    )
+    WHERE copy_number > 1
+    ORDER BY position
+"""
 
 def debug_rule_analysis_function():
     """Debug the rule analysis function directly."""
@@ -12,29 +50,30 @@ def debug_rule_analysis_function():
     print("=" * 50)
     
     try:
+        with write_conn() as conn:
+            ensure_indexes(conn)
+        
         # Test with both SET and XML audits
-        conn = sqlite3.connect('firewall_tool.db')
-        cursor = conn.cursor()
-        
-        # Get a SET format audit
-        cursor.execute("""
-            SELECT id FROM audit_sessions 
-            WHERE filename LIKE '%.txt'
-            ORDER BY id DESC 
-            LIMIT 1
-        """)
-        set_audit = cursor.fetchone()
-        
-        # Get an XML format audit
-        cursor.execute("""
-            SELECT id FROM audit_sessions 
-            WHERE filename LIKE '%.xml'
-            ORDER BY id DESC 
-            LIMIT 1
-        """)
-        xml_audit = cursor.fetchone()
-        
-        conn.close()
+        with read_snapshot() as conn:
+            cursor = conn.cursor()
+            
+            # Get a SET format audit
+            cursor.execute("""
+                SELECT id FROM audit_sessions 
+                WHERE filename LIKE '%.txt'
+                ORDER BY id DESC 
+                LIMIT 1
+            """)
+            set_audit = cursor.fetchone()
+            
+            # Get an XML format audit
+            cursor.execute("""
+                SELECT id FROM audit_sessions 
+                WHERE filename LIKE '%.xml'
+                ORDER BY id DESC 
+                LIMIT 1
+            """)
+            xml_audit = cursor.fetchone()
         
         if set_audit:
             print(f"\n🔧 Testing SET Format Rule Analysis (Audit {set_audit[0]}):")
@@ -46,20 +85,27 @@ def debug_rule_analysis_function():
         
         return True
         
-    except Exception as e:
-        print(f"❌ Debug failed: {str(e)}")
+    except Exception:
+        log.exception("Rule analysis debug failed")
         return False
 
+@lru_cache(maxsize=32)
+def _analyze_rule_usage(audit_id, mtime):
+    """Run analyze_rule_usage for one audit; ``mtime`` only keys the cache."""
+    return analyze_rule_usage(audit_id)
+
 def test_rule_analysis_function(audit_id, format_type):
-    """Test the rule analysis function directly."""
+    """Test the rule analysis function directly.
+
+    Results are cached against ``db_mtime``, so repeat calls for an audit
+    reuse the analysis until the database is written.
+    """
     
     try:
-        from src.utils.parse_config import analyze_rule_usage
-        
         print(f"   🧪 Calling analyze_rule_usage({audit_id})...")
         
         # Call the function directly
-        result = analyze_rule_usage(audit_id)
+        result = _analyze_rule_usage(audit_id, db_mtime())
         
         print(f"   📊 {format_type} Rule Analysis Results:")
         print(f"      Unused Rules: {len(result.get('unused_rules', []))}")
@@ -67,9 +113,11 @@ def test_rule_analysis_function(audit_id, format_type):
         print(f"      Shadowed Rules: {len(result.get('shadowed_rules', []))}")
         print(f"      Overlapping Rules: {len(result.get('overlapping_rules', []))}")
         
-        # Show sample results
+        # Show sample results, totalling them in the same pass
+        total_results = 0
         for category, items in result.items():
             if items and len(items) > 0:
+                total_results += len(items)
                 print(f"   ✅ {category} ({len(items)} items):")
                 for i, item in enumerate(items[:2]):  # Show first 2
                     if isinstance(item, dict):
@@ -81,8 +129,6 @@ def test_rule_analysis_function(audit_id, format_type):
                 print(f"   ⚪ {category}: Empty")
         
         # Check if the function is working at all
-        total_results = sum(len(items) for items in result.values() if items)
-        
         if total_results == 0:
             print(f"   🚨 {format_type} RULE ANALYSIS COMPLETELY BROKEN!")
             print(f"      Function returns empty results for all categories")
@@ -94,54 +140,41 @@ def test_rule_analysis_function(audit_id, format_type):
         
         return result
         
-    except Exception as e:
-        print(f"   ❌ {format_type} Rule analysis function failed: {str(e)}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        log.exception("%s rule analysis function failed", format_type)
         return None
 
 def debug_rules_in_database(audit_id, format_type):
     """Debug what rules exist in the database for this audit."""
     
     try:
-        conn = sqlite3.connect('firewall_tool.db')
-        cursor = conn.cursor()
+        with read_snapshot() as conn:
+            # Totals and duplicates are computed in SQLite; only the sample
+            # rows and the duplicate pairs are fetched
+            counts = load_audit_counts(conn, audit_id)
+            sample_rules = conn.execute(SQL_SAMPLE_RULES, (audit_id, SAMPLE_RULE_COUNT)).fetchall()
+            duplicate_rules = conn.execute(SQL_DUPLICATE_RULES, (audit_id,)).fetchall()
         
-        cursor.execute("""
-            SELECT rule_name, src_zone, dst_zone, src, dst, service, action, is_disabled
-            FROM firewall_rules 
-            WHERE audit_id = ?
-            ORDER BY position
-        """, (audit_id,))
+        rule_count = counts['rules']
+        disabled_count = counts['disabled_rules']
         
-        rules = cursor.fetchall()
+        print(f"   🔍 {format_type} Rules in Database ({rule_count}):")
+        # Sample rows are written as one tab-separated block for other tools
+        print(SAMPLE_RULE_HEADER)
+        sys.stdout.writelines('\t'.join(map(str, rule)) + '\n' for rule in sample_rules)
         
-        print(f"   🔍 {format_type} Rules in Database ({len(rules)}):")
-        for i, rule in enumerate(rules[:5]):  # Show first 5
-            rule_name, src_zone, dst_zone, src, dst, service, action, is_disabled = rule
-            status = "DISABLED" if is_disabled else "ENABLED"
-            print(f"      {i+1}. '{rule_name}' | {src_zone}→{dst_zone} | {src}→{dst} | {service} | {action} | {status}")
-        
-        if len(rules) > 5:
-            print(f"      ... and {len(rules) - 5} more rules")
+        if rule_count > SAMPLE_RULE_COUNT:
+            print(f"      ... and {rule_count - SAMPLE_RULE_COUNT} more rules")
         
         # Check for obvious duplicates
-        rule_signatures = {}
-        duplicates_found = 0
-        
-        for rule_name, src_zone, dst_zone, src, dst, service, action, is_disabled in rules:
-            if not is_disabled:
-                signature = f"{src_zone}-{dst_zone}-{src}-{dst}-{service}-{action}"
-                if signature in rule_signatures:
-                    duplicates_found += 1
-                    print(f"      🔄 DUPLICATE: '{rule_name}' has same signature as '{rule_signatures[signature]}'")
-                else:
-                    rule_signatures[signature] = rule_name
-        
-        disabled_count = sum(1 for rule in rules if rule[7])
+        duplicates_found = len(duplicate_rules)
+        sys.stdout.writelines(
+            f"      🔄 DUPLICATE: '{rule_name}' has same signature as '{original_name}'\n"
+            for rule_name, original_name in duplicate_rules
+        )
         
         print(f"   📊 {format_type} Rule Statistics:")
-        print(f"      Total rules: {len(rules)}")
+        print(f"      Total rules: {rule_count}")
         print(f"      Disabled rules: {disabled_count}")
         print(f"      Manual duplicate detection: {duplicates_found}")
         
@@ -151,10 +184,8 @@ def debug_rules_in_database(audit_id, format_type):
         if disabled_count > 0:
             print(f"      🚨 Should detect {disabled_count} unused rules but may find 0!")
         
-        conn.close()
-        
-    except Exception as e:
-        print(f"   ❌ Database debug failed: {str(e)}")
+    except Exception:
+        log.exception("%s database debug failed", format_type)
 
 if __name__ == "__main__":
     print("🚀 DEBUGGING RULE ANALYSIS FUNCTION")
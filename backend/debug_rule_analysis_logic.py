@@ -3,7 +3,11 @@
 Debug the rule analysis logic to understand why it's finding too many issues.
 """
 
-import sqlite3
+import sys
+from collections import deque
+
+from db_pool import write_conn
+from diagnostic_utils import ensure_indexes, latest_audit, load_audit_rules
 
 def debug_rule_analysis_logic():
     """Debug why rule analysis is finding too many issues."""
@@ -12,111 +16,97 @@ def debug_rule_analysis_logic():
     print("=" * 50)
     
     try:
-        # Get the most recent audit
-        conn = sqlite3.connect('firewall_tool.db')
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT id FROM audit_sessions ORDER BY id DESC LIMIT 1
-        """)
+        with write_conn() as conn:
+            ensure_indexes(conn)
         
-        audit = cursor.fetchone()
+        # Get the most recent audit (cached until the database changes)
+        audit = latest_audit()
         if not audit:
             print("❌ No audit sessions found")
             return
         
         audit_id = audit[0]
         
-        # Get all rules
-        cursor.execute("""
-            SELECT rule_name, rule_type, src_zone, dst_zone, src, dst, service, action, position, is_disabled
-            FROM firewall_rules 
-            WHERE audit_id = ?
-            ORDER BY position
-        """, (audit_id,))
-        
-        rules = cursor.fetchall()
-        print(f"📊 Total Rules in Database: {len(rules)}")
-        
-        # Analyze the rules manually
-        print(f"\n📋 Rule Analysis:")
-        
+        # One pass over the audit's rules fills every section of the report;
+        # each section's lines are collected and written in report order below
+        rule_lines = []
+        duplicate_lines = []
+        unused_lines = []
+        total_rules = 0
         enabled_rules = []
-        disabled_rules = []
-        
-        for rule in rules:
-            rule_name, rule_type, src_zone, dst_zone, src, dst, service, action, position, is_disabled = rule
+        rule_signatures = {}
+        actual_duplicates = []
+        actual_unused = []
+        # Enabled rules grouped by signature in position order, for the shadowing check
+        shadow_groups = {}
+        
+        for rule in load_audit_rules(audit_id):
+            total_rules += 1
+            rule_name = rule.rule_name
+            is_disabled = rule.is_disabled
+            signature = rule.signature
             
-            if is_disabled:
-                disabled_rules.append(rule)
+            rule_lines.append(f"   {rule.position:2d}. {rule_name}\n")
+            rule_lines.append(f"       {rule.src_zone} → {rule.dst_zone} | {rule.src} → {rule.dst} | "
+                              f"{rule.service} | {rule.action} | {'DISABLED' if is_disabled else 'ENABLED'}\n")
+            
+            # Duplicates are checked across enabled and disabled rules alike
+            original_name = rule_signatures.get(signature)
+            if original_name is None:
+                rule_signatures[signature] = rule_name
             else:
-                enabled_rules.append(rule)
+                actual_duplicates.append((original_name, rule_name))
+                duplicate_lines.append(f"   DUPLICATE: '{rule_name}' duplicates '{original_name}'\n")
             
-            print(f"   {position:2d}. {rule_name}")
-            print(f"       {src_zone} → {dst_zone} | {src} → {dst} | {service} | {action} | {'DISABLED' if is_disabled else 'ENABLED'}")
+            # Simple unused criteria
+            if is_disabled:
+                actual_unused.append(rule_name)
+                unused_lines.append(f"   UNUSED: '{rule_name}' (disabled)\n")
+            else:
+                enabled_rules.append((rule_name, signature))
+                shadow_groups.setdefault(signature, deque()).append(rule_name)
+        
+        print(f"📊 Total Rules in Database: {total_rules}")
+        
+        # Analyze the rules manually
+        print(f"\n📋 Rule Analysis:")
+        sys.stdout.writelines(rule_lines)
         
         print(f"\n📈 Rule Categorization:")
         print(f"   Enabled rules: {len(enabled_rules)}")
-        print(f"   Disabled rules: {len(disabled_rules)}")
+        print(f"   Disabled rules: {len(actual_unused)}")
         
         # Manual duplicate detection
         print(f"\n🔍 Manual Duplicate Analysis:")
-        rule_signatures = {}
-        actual_duplicates = []
-        
-        for rule in rules:
-            rule_name, rule_type, src_zone, dst_zone, src, dst, service, action, position, is_disabled = rule
-            
-            # Create a simple signature
-            signature = f"{src_zone}-{dst_zone}-{src}-{dst}-{service}-{action}"
-            
-            if signature in rule_signatures:
-                original_rule = rule_signatures[signature]
-                actual_duplicates.append((original_rule[0], rule_name))
-                print(f"   DUPLICATE: '{rule_name}' duplicates '{original_rule[0]}'")
-            else:
-                rule_signatures[signature] = rule
-        
+        sys.stdout.writelines(duplicate_lines)
         print(f"   Actual duplicates found: {len(actual_duplicates)}")
         
         # Manual unused rule analysis
         print(f"\n🔍 Manual Unused Rule Analysis:")
-        actual_unused = []
-        
-        for rule in rules:
-            rule_name, rule_type, src_zone, dst_zone, src, dst, service, action, position, is_disabled = rule
-            
-            # Simple unused criteria
-            if is_disabled:
-                actual_unused.append(rule_name)
-                print(f"   UNUSED: '{rule_name}' (disabled)")
-        
+        sys.stdout.writelines(unused_lines)
         print(f"   Actual unused rules: {len(actual_unused)}")
         
         # Manual shadowed rule analysis
         print(f"\n🔍 Manual Shadowed Rule Analysis:")
         actual_shadowed = []
         
-        # Very simple shadowing check - rules with identical signatures where one comes before another
-        for i, rule1 in enumerate(rules):
-            for j, rule2 in enumerate(rules):
-                if i < j:  # rule1 comes before rule2
-                    rule1_name, _, src_zone1, dst_zone1, src1, dst1, service1, action1, _, disabled1 = rule1
-                    rule2_name, _, src_zone2, dst_zone2, src2, dst2, service2, action2, _, disabled2 = rule2
-                    
-                    # If rule1 has broader or equal scope and same action, it shadows rule2
-                    if (action1 == action2 and not disabled1 and not disabled2 and
-                        src_zone1 == src_zone2 and dst_zone1 == dst_zone2 and
-                        src1 == src2 and dst1 == dst2 and service1 == service2):
-                        actual_shadowed.append(rule2_name)
-                        print(f"   SHADOWED: '{rule2_name}' shadowed by '{rule1_name}'")
+        # Very simple shadowing check - rules with identical signatures where one comes before another.
+        # Each enabled rule shadows the rules still queued behind it in its signature group
+        shadowed_lines = []
+        for rule1_name, signature in enabled_rules:
+            later_rules = shadow_groups[signature]
+            later_rules.popleft()  # rule1 itself
+            for rule2_name in later_rules:
+                actual_shadowed.append(rule2_name)
+                shadowed_lines.append(f"   SHADOWED: '{rule2_name}' shadowed by '{rule1_name}'\n")
+        sys.stdout.writelines(shadowed_lines)
         
         print(f"   Actual shadowed rules: {len(actual_shadowed)}")
         
         # Summary
         print(f"\n📊 Manual Analysis Summary:")
-        print(f"   Total rules: {len(rules)}")
-        print(f"   Disabled (unused): {len(disabled_rules)}")
+        print(f"   Total rules: {total_rules}")
+        print(f"   Disabled (unused): {len(actual_unused)}")
         print(f"   Duplicates: {len(actual_duplicates)}")
         print(f"   Shadowed: {len(actual_shadowed)}")
         print(f"   Overlapping: 0 (need better logic)")
@@ -130,15 +120,13 @@ def debug_rule_analysis_logic():
         print(f"   Expected overlapping: 0-5")
         
         print(f"\n   Current analysis finds:")
-        print(f"   Total rules: {len(rules)} {'✅' if len(rules) == 17 else '❌'}")
+        print(f"   Total rules: {total_rules} {'✅' if total_rules == 17 else '❌'}")
         print(f"   Duplicates: {len(actual_duplicates)} {'✅' if len(actual_duplicates) <= 2 else '❌'}")
         print(f"   Unused: {len(actual_unused)} {'✅' if len(actual_unused) <= 2 else '❌'}")
         print(f"   Shadowed: {len(actual_shadowed)} {'✅' if len(actual_shadowed) <= 2 else '❌'}")
         
-        conn.close()
-        
         return {
-            'total_rules': len(rules),
+            'total_rules': total_rules,
             'duplicates': len(actual_duplicates),
             'unused': len(actual_unused),
             'shadowed': len(actual_shadowed)
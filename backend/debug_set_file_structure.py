@@ -6,6 +6,11 @@ Debug the actual set file structure to understand parsing issues.
 import sqlite3
 import requests
 
+# Sample lines shown per command type
+SAMPLE_LINES = 5
+# Lines longer than this are reported as possibly concatenated commands
+LONG_LINE_LENGTH = 200
+
 def debug_set_file_structure():
     """Debug the set file structure and parsing."""
     
@@ -52,56 +57,92 @@ def debug_set_file_structure():
                     if line:
                         print(f"   {i+1:2d}. {line}")
                 
-                # Analyze set command patterns
-                print(f"\n🔍 Set Command Analysis:")
+                # Classify every line in one pass, stripping and lowercasing it once
+                address_count = service_count = rule_count = 0
+                address_samples, service_samples, rule_samples = [], [], []
+                std_address = std_service = std_security = rulebase_security = 0
+                long_count = multi_line_count = 0
+                first_long_line = None
                 
-                address_lines = [line for line in lines if 'set address' in line.lower()]
-                service_lines = [line for line in lines if 'set service' in line.lower()]
-                rule_lines = [line for line in lines if 'set rulebase security rules' in line.lower() or 'set security rules' in line.lower()]
+                for line in lines:
+                    stripped = line.strip()
+                    lower = stripped.lower()
+                    
+                    if 'set address' in lower:
+                        address_count += 1
+                        if len(address_samples) < SAMPLE_LINES:
+                            address_samples.append(stripped)
+                    if 'set service' in lower:
+                        service_count += 1
+                        if len(service_samples) < SAMPLE_LINES:
+                            service_samples.append(stripped)
+                    if 'set rulebase security rules' in lower or 'set security rules' in lower:
+                        rule_count += 1
+                        if len(rule_samples) < SAMPLE_LINES:
+                            rule_samples.append(stripped)
+                    
+                    # The format prefixes are case-sensitive and mutually exclusive
+                    if stripped.startswith('set '):
+                        if stripped.startswith('set address'):
+                            std_address += 1
+                        elif stripped.startswith('set service'):
+                            std_service += 1
+                        elif stripped.startswith('set security rules'):
+                            std_security += 1
+                        elif stripped.startswith('set rulebase security rules'):
+                            rulebase_security += 1
+                    
+                    if len(line) > LONG_LINE_LENGTH:
+                        if first_long_line is None:
+                            first_long_line = line
+                        long_count += 1
+                        if 'set' in line:
+                            multi_line_count += 1
                 
-                print(f"   Address object lines: {len(address_lines)}")
-                print(f"   Service object lines: {len(service_lines)}")
-                print(f"   Security rule lines: {len(rule_lines)}")
+                # Analyze set command patterns
+                print(f"\n🔍 Set Command Analysis:")
+                print(f"   Address object lines: {address_count}")
+                print(f"   Service object lines: {service_count}")
+                print(f"   Security rule lines: {rule_count}")
                 
                 # Show sample address objects
-                if address_lines:
+                if address_samples:
                     print(f"\n📦 Sample Address Objects:")
-                    for i, line in enumerate(address_lines[:5]):
-                        print(f"   {i+1}. {line.strip()}")
+                    for i, line in enumerate(address_samples):
+                        print(f"   {i+1}. {line}")
                 
                 # Show sample service objects
-                if service_lines:
+                if service_samples:
                     print(f"\n🔧 Sample Service Objects:")
-                    for i, line in enumerate(service_lines[:5]):
-                        print(f"   {i+1}. {line.strip()}")
+                    for i, line in enumerate(service_samples):
+                        print(f"   {i+1}. {line}")
                 
                 # Show sample rules
-                if rule_lines:
+                if rule_samples:
                     print(f"\n📋 Sample Security Rules:")
-                    for i, line in enumerate(rule_lines[:5]):
-                        print(f"   {i+1}. {line.strip()}")
+                    for i, line in enumerate(rule_samples):
+                        print(f"   {i+1}. {line}")
                 
                 # Check if this is a different set format
                 print(f"\n🔍 Set Format Analysis:")
                 
                 # Check for different set command patterns
                 patterns = {
-                    'Standard set address': len([l for l in lines if l.strip().startswith('set address')]),
-                    'Standard set service': len([l for l in lines if l.strip().startswith('set service')]),
-                    'Standard set security rules': len([l for l in lines if l.strip().startswith('set security rules')]),
-                    'Rulebase set security rules': len([l for l in lines if l.strip().startswith('set rulebase security rules')]),
-                    'Multi-line commands': len([l for l in lines if 'set' in l and len(l) > 200])
+                    'Standard set address': std_address,
+                    'Standard set service': std_service,
+                    'Standard set security rules': std_security,
+                    'Rulebase set security rules': rulebase_security,
+                    'Multi-line commands': multi_line_count
                 }
                 
                 for pattern, count in patterns.items():
                     print(f"   {pattern}: {count} lines")
                 
                 # Check if commands are on single lines or split across multiple lines
-                long_lines = [line for line in lines if len(line) > 200]
-                if long_lines:
-                    print(f"\n⚠️  Found {len(long_lines)} very long lines (>200 chars)")
+                if long_count:
+                    print(f"\n⚠️  Found {long_count} very long lines (>{LONG_LINE_LENGTH} chars)")
                     print(f"   This suggests commands might be concatenated or malformed")
-                    print(f"   Sample long line: {long_lines[0][:100]}...")
+                    print(f"   Sample long line: {first_long_line[:100]}...")
                 
                 return content
                 
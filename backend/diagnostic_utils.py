@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+"""
+Shared helpers for the backend diagnostic scripts.
+"""
+
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import sys
+import threading
+from concurrent.futures import Future
+from functools import lru_cache
+from typing import NamedTuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+DB_PATH = 'firewall_tool.db'
+API_BASE_URL = 'http://127.0.0.1:8000/api/v1'
+
+# Pooled keep-alive connections per host; covers the few concurrent GETs a script issues
+HTTP_POOL_SIZE = 4
+
+# Upload format implied by a config file's extension
+FORMAT_BY_EXT = {'.txt': 'SET', '.csv': 'CSV', '.xml': 'XML'}
+
+# Applied to every diagnostic connection right after it is opened, as a
+# single script rather than one statement per pragma.
+CONNECTION_PRAGMAS = """
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA cache_size=-20000;
+    PRAGMA mmap_size=268435456;
+    PRAGMA busy_timeout=5000;
+"""
+
+# Composite indexes backing the per-audit filters, ORDER BY clauses and
+# cross-audit name joins used by the diagnostic queries.
+DIAGNOSTIC_INDEXES = {
+    'idx_rules_audit_pos': "CREATE INDEX IF NOT EXISTS idx_rules_audit_pos ON firewall_rules(audit_id, position)",
+    'idx_rules_audit_disabled': "CREATE INDEX IF NOT EXISTS idx_rules_audit_disabled ON firewall_rules(audit_id, is_disabled)",
+    'idx_rules_name': "CREATE INDEX IF NOT EXISTS idx_rules_name ON firewall_rules(rule_name, audit_id)",
+    'idx_objs_audit_name': "CREATE INDEX IF NOT EXISTS idx_objs_audit_name ON object_definitions(audit_id, name)",
+    'idx_audit_recent': "CREATE INDEX IF NOT EXISTS idx_audit_recent ON audit_sessions(id DESC, session_name, filename, start_time)",
+    'idx_objs_audit_type_value': "CREATE INDEX IF NOT EXISTS idx_objs_audit_type_value ON object_definitions(audit_id, object_type, value, name)",
+}
+
+# Sample sizes kept in an audit snapshot; callers that show fewer rows slice
+# the front of the (already ordered) samples.
+SNAPSHOT_OBJECT_SAMPLES = 8
+SNAPSHOT_RULE_SAMPLES = 5
+
+SQL_LATEST_AUDIT = '''
+    SELECT id, session_name, filename, start_time
+    FROM audit_sessions
+    ORDER BY id DESC
+    LIMIT 1
+'''
+SQL_AUDIT_RULES = '''
+    SELECT rule_name, src_zone, dst_zone, src, dst, service, action, position, is_disabled
+    FROM firewall_rules
+    WHERE audit_id = :audit_id
+    ORDER BY position
+'''
+SQL_AUDIT_COUNTS = '''
+    SELECT (SELECT COUNT(*) FROM object_definitions WHERE audit_id = :audit_id),
+           (SELECT COUNT(*) FROM firewall_rules WHERE audit_id = :audit_id)
+'''
+# Usage/disabled breakdown for one audit, aggregated in SQL so no rows are
+# shipped to Python. COUNT(CASE ...) rather than FILTER keeps it working on
+# SQLite < 3.30 and yields 0 (not NULL) for an empty audit.
+SQL_AUDIT_USAGE_COUNTS = '''
+    SELECT o.total, o.used, o.unused, r.total, r.disabled
+    FROM (SELECT COUNT(*) AS total,
+                 COUNT(CASE WHEN used_in_rules > 0 THEN 1 END) AS used,
+                 COUNT(CASE WHEN used_in_rules = 0 THEN 1 END) AS unused
+          FROM object_definitions
+          WHERE audit_id = :audit_id) AS o,
+         (SELECT COUNT(*) AS total,
+                 COUNT(CASE WHEN is_disabled THEN 1 END) AS disabled
+          FROM firewall_rules
+          WHERE audit_id = :audit_id) AS r
+'''
+# First few objects and rules for one audit in a single round-trip. Each half
+# is capped in SQL so only sampled rows are materialised; the leading
+# kind/sort_key columns partition and order the two halves of the result.
+SQL_AUDIT_SAMPLES = '''
+    SELECT * FROM (
+        SELECT 'obj' AS kind, name AS sort_key, name, object_type, value, used_in_rules, NULL, NULL, NULL
+        FROM object_definitions
+        WHERE audit_id = :audit_id
+        ORDER BY name
+        LIMIT :obj_limit
+    )
+    UNION ALL
+    SELECT * FROM (
+        SELECT 'rule', position, rule_name, src_zone, dst_zone, src, dst, service, action
+        FROM firewall_rules
+        WHERE audit_id = :audit_id
+        ORDER BY position
+        LIMIT :rule_limit
+    )
+    ORDER BY kind, sort_key
+'''
+
+def detect_format(filename):
+    """Return the upload format (SET/CSV/XML) for a filename, or UNKNOWN."""
+    _, ext = os.path.splitext(filename or '')
+    return FORMAT_BY_EXT.get(ext.lower(), 'UNKNOWN')
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def http_session():
+    """Return the process-wide keep-alive session used for API calls.
+
+    Every diagnostic request to the local API goes through this one
+    ``requests.Session`` so repeated calls reuse the pooled TCP connections.
+    The pool holds ``HTTP_POOL_SIZE`` connections so requests issued from
+    worker threads each get one instead of opening a throwaway socket.
+
+    The API is served by uvicorn over plain HTTP/1.1, so an HTTP/2 client
+    would not multiplex anything here; keep-alive reuse is the whole win.
+    """
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount('http://', adapter)
+            _http_session = session
+    return _http_session
+
+def loads_json(data):
+    """Decode JSON text or bytes, using orjson when it is installed."""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dumps_json(obj):
+    """Encode obj as compact JSON text, using orjson when it is installed."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, default=str).decode()
+    return json.dumps(obj, default=str, separators=(',', ':'))
+
+# Set by a script's --json flag: emit() then writes one JSON object per line
+# and note() is silent, so the output can be consumed with loads_json
+_json_output = False
+
+def set_json_output(enabled):
+    """Switch emit()/note() between human-readable lines and NDJSON records."""
+    global _json_output
+    _json_output = bool(enabled)
+
+def emit(event, text, **fields):
+    """Report one finding: ``text`` for humans, or ``{"event": event, **fields}`` as JSON.
+
+    A ``text`` of None makes the finding JSON-only.
+    """
+    if _json_output:
+        print(dumps_json({'event': event, **fields}))
+    elif text is not None:
+        print(text)
+
+def note(text):
+    """Print a heading or hint that carries no data; omitted from JSON output."""
+    if not _json_output:
+        print(text)
+
+# Last ETag and decoded body per URL, for revalidating repeat GETs
+_ETAG_CACHE = {}
+_JSON_CACHE = {}
+
+# Decoded bodies persisted between script runs, one JSON file per URL. The
+# version is part of the file name, so a format change starts a fresh cache
+JSON_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'fw_debug')
+JSON_CACHE_VERSION = 1
+
+# Cleared by FW_DEBUG_NO_CACHE or a script's --no-cache flag, e.g. to check a
+# server-side fix without any previously stored response
+_disk_cache_enabled = not os.environ.get('FW_DEBUG_NO_CACHE')
+
+def set_disk_cache(enabled):
+    """Switch get_json_cached's on-disk cache on or off for this process."""
+    global _disk_cache_enabled
+    _disk_cache_enabled = bool(enabled)
+
+def _json_cache_path(url):
+    """Return the on-disk cache file for a URL."""
+    name = hashlib.sha1(url.encode()).hexdigest()
+    return os.path.join(JSON_CACHE_DIR, f"{name}.v{JSON_CACHE_VERSION}.json")
+
+def _load_cached_json(url):
+    """Return the (etag, payload) pair stored on disk for a URL, or None.
+
+    A missing, unreadable or malformed file is treated as a cache miss.
+    """
+    if not _disk_cache_enabled:
+        return None
+    try:
+        with open(_json_cache_path(url), 'rb') as f:
+            etag, payload = loads_json(f.read())
+    except (OSError, ValueError, TypeError):
+        return None
+    if not isinstance(etag, str):
+        return None
+    return etag, payload
+
+def _store_cached_json(url, etag, payload):
+    """Persist an ETag and its decoded payload; a failed write only loses the cache."""
+    if not _disk_cache_enabled:
+        return
+    path = _json_cache_path(url)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(JSON_CACHE_DIR, exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(dumps_json((etag, payload)))
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+class Coalescer:
+    """Share one in-flight call among concurrent callers asking for the same key.
+
+    The first caller for a key runs ``fn``; callers arriving while it is
+    still running wait for and receive the same result, or the same
+    exception. Once the call finishes the key is forgotten, so later
+    callers start a fresh call.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    def execute(self, key, fn):
+        """Return ``fn()``, or the result of an identical call already in flight."""
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+_get_coalescer = Coalescer()
+
+def get_json_cached(url, timeout=5):
+    """GET a JSON API resource, revalidating with If-None-Match.
+
+    When an earlier response for ``url`` carried an ETag, it is sent back
+    as If-None-Match; a 304 reuses the body decoded last time instead of
+    downloading and parsing it again. Unless disabled with set_disk_cache
+    or FW_DEBUG_NO_CACHE, the ETag and decoded body are also stored as JSON
+    under ``JSON_CACHE_DIR`` so later runs of a script skip the parse too.
+    Concurrent calls for the same URL from several threads
+    share a single request.
+
+    Returns:
+        (status_code, payload) where a 304 is reported as 200 with the
+        cached payload, and payload is None for any other non-200 status.
+    """
+    return _get_coalescer.execute(url, lambda: _fetch_json(url, timeout))
+
+def _fetch_json(url, timeout):
+    """Issue the conditional GET behind get_json_cached."""
+    headers = {}
+    etag = _ETAG_CACHE.get(url)
+    if etag is None:
+        stored = _load_cached_json(url)
+        if stored:
+            etag, _JSON_CACHE[url] = stored
+            _ETAG_CACHE[url] = etag
+    if etag:
+        headers['If-None-Match'] = etag
+    response = http_session().get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304 and url in _JSON_CACHE:
+        return 200, _JSON_CACHE[url]
+    if response.status_code != 200:
+        return response.status_code, None
+    payload = loads_json(response.content)
+    etag = response.headers.get('ETag')
+    if etag:
+        _ETAG_CACHE[url] = etag
+        _JSON_CACHE[url] = payload
+        _store_cached_json(url, etag, payload)
+    return 200, payload
+
+def db_mtime(path=DB_PATH):
+    """Return a cache key that changes whenever the database is written.
+
+    In WAL mode writes land in the ``-wal`` file until a checkpoint, so its
+    modification time is part of the key alongside the main file's.
+    """
+    wal_path = f'{path}-wal'
+    wal_mtime = os.stat(wal_path).st_mtime_ns if os.path.exists(wal_path) else 0
+    return os.stat(path).st_mtime_ns, wal_mtime
+
+def buffer_stdout(buffer_size=1 << 16):
+    """Replace sys.stdout with a block-buffered writer.
+
+    Under a pipe or CI log capture a line-buffered stdout issues one write per
+    ``print``; this batches output into ``buffer_size`` chunks instead. Call it
+    once from a script's ``__main__`` block.
+    """
+    sys.stdout.flush()
+    raw = io.FileIO(sys.stdout.fileno(), 'w', closefd=False)
+    sys.stdout = io.TextIOWrapper(
+        io.BufferedWriter(raw, buffer_size),
+        encoding=sys.stdout.encoding,
+        errors=sys.stdout.errors,
+        line_buffering=False,
+        write_through=False,
+    )
+
+def open_db(path=DB_PATH, read_only=True, check_same_thread=True):
+    """Open a SQLite connection tuned for the diagnostic scripts.
+
+    Connections use SQLite's ``mode=ro`` or ``mode=rw`` URI, so a missing
+    database raises instead of silently creating an empty file; read-only
+    ones additionally set ``query_only``. Switching the journal to WAL is a
+    write, so it is only issued on writable connections.
+    """
+    if read_only:
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True, check_same_thread=check_same_thread)
+    else:
+        conn = sqlite3.connect(f'file:{path}?mode=rw', uri=True, check_same_thread=check_same_thread)
+        conn.execute("PRAGMA journal_mode=WAL")
+
+    conn.executescript(CONNECTION_PRAGMAS)
+
+    if read_only:
+        conn.execute("PRAGMA query_only=ON")
+
+    return conn
+
+@lru_cache(maxsize=1)
+def _latest_audit(path, mtime):
+    """Query the newest audit; ``mtime`` only keys the cache."""
+    conn = open_db(path)
+    try:
+        return conn.execute(SQL_LATEST_AUDIT).fetchone()
+    finally:
+        conn.close()
+
+def latest_audit(path=DB_PATH):
+    """Return the most recent audit session, or None when there is none.
+
+    The lookup is cached against ``db_mtime``, so repeat calls while the
+    database is unchanged cost a stat() instead of a connect and query.
+
+    Returns:
+        (id, session_name, filename, start_time) tuple, or None.
+    """
+    return _latest_audit(path, db_mtime(path))
+
+@lru_cache(maxsize=32)
+def _load_audit_snapshot(path, mtime, audit_id):
+    """Read one audit's counts and samples; ``mtime`` only keys the cache."""
+    # db_pool imports this module, so the pool is resolved at call time
+    from db_pool import read_conn
+    
+    with read_conn(path) as conn:
+        object_count, rule_count = conn.execute(SQL_AUDIT_COUNTS, {'audit_id': audit_id}).fetchone()
+        objects = []
+        rules = []
+        params = {'audit_id': audit_id, 'obj_limit': SNAPSHOT_OBJECT_SAMPLES, 'rule_limit': SNAPSHOT_RULE_SAMPLES}
+        for kind, sort_key, *fields in conn.execute(SQL_AUDIT_SAMPLES, params):
+            if kind == 'obj':
+                objects.append(tuple(fields[:4]))
+            else:
+                rules.append((sort_key, *fields))
+    return {
+        'object_count': object_count,
+        'rule_count': rule_count,
+        'objects': tuple(objects),
+        'rules': tuple(rules),
+    }
+
+def load_audit_snapshot(audit_id, path=DB_PATH):
+    """Return the counts and leading sample rows stored for one audit.
+
+    Cached against ``db_mtime`` like ``load_audit_rules``, so comparison
+    helpers run in the same process (for example check_db_differences and
+    compare_formats) share one set of queries per audit between writes.
+
+    Returns:
+        dict with ``object_count``, ``rule_count``, ``objects`` (tuples of
+        name, object_type, value, used_in_rules ordered by name) and ``rules``
+        (tuples of position, rule_name, src_zone, dst_zone, src, dst, service,
+        action ordered by position).
+    """
+    return _load_audit_snapshot(path, db_mtime(path), audit_id)
+
+class AuditRule(NamedTuple):
+    """One stored rule as read by load_audit_rules."""
+    rule_name: str
+    src_zone: str
+    dst_zone: str
+    src: str
+    dst: str
+    service: str
+    action: str
+    position: int
+    is_disabled: bool
+
+    @property
+    def signature(self):
+        """The (src_zone, dst_zone, src, dst, service, action) tuple duplicate checks compare."""
+        return self[1:7]
+
+@lru_cache(maxsize=16)
+def _load_audit_rules(path, mtime, audit_id):
+    """Read one audit's rules; ``mtime`` only keys the cache."""
+    conn = open_db(path)
+    try:
+        return tuple(AuditRule._make(row) for row in conn.execute(SQL_AUDIT_RULES, {'audit_id': audit_id}))
+    finally:
+        conn.close()
+
+def load_audit_rules(audit_id, path=DB_PATH):
+    """Return every rule stored for one audit, ordered by position.
+
+    Cached against ``db_mtime`` like ``latest_audit``, so the rule-analysis
+    debug helpers run in one process (debug_rule_analysis_function and
+    debug_rule_analysis_logic) read an audit's rules once between writes.
+
+    Returns:
+        tuple of AuditRule.
+    """
+    return _load_audit_rules(path, db_mtime(path), audit_id)
+
+def load_audit_counts(conn, audit_id):
+    """Return the object and rule totals for one audit without fetching rows.
+
+    Returns:
+        dict with ``objects``, ``used_objects``, ``unused_objects``,
+        ``rules`` and ``disabled_rules``.
+    """
+    row = conn.execute(SQL_AUDIT_USAGE_COUNTS, {'audit_id': audit_id}).fetchone()
+    return dict(zip(('objects', 'used_objects', 'unused_objects', 'rules', 'disabled_rules'), row))
+
+def ensure_indexes(conn):
+    """Create the diagnostic indexes if they are missing.
+
+    ``conn`` must be writable (see ``db_pool.write_conn``). ``ANALYZE`` only
+    runs when an index was actually created, so repeated invocations stay
+    cheap. Returns the number of indexes created.
+    """
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    missing = [sql for name, sql in DIAGNOSTIC_INDEXES.items() if name not in existing]
+    if missing:
+        # executescript runs the whole batch inside one explicit transaction
+        conn.executescript("BEGIN;\n" + ";\n".join(missing) + ";\nCOMMIT;\nANALYZE;")
+    return len(missing)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Sample SET-format configs with their expected parse counts, shared by
+debug_actual_parsing.py and the parser tests.
+"""
+
+# Two rules built from incremental set commands
+SMALL_SET_CONTENT = """set address Server-Web-01 ip-netmask 192.168.10.10/32
+set address Server-DB-01 ip-netmask 192.168.10.20/32
+
+set rulebase security rules Allow-Web-Access from trust
+set rulebase security rules Allow-Web-Access to untrust
+set rulebase security rules Allow-Web-Access source Server-Web-01
+set rulebase security rules Allow-Web-Access destination any
+set rulebase security rules Allow-Web-Access service service-http
+set rulebase security rules Allow-Web-Access action allow
+
+set rulebase security rules Allow-DB-Access from trust
+set rulebase security rules Allow-DB-Access to dmz
+set rulebase security rules Allow-DB-Access source Server-DB-01
+set rulebase security rules Allow-DB-Access destination any
+set rulebase security rules Allow-DB-Access service service-mysql
+set rulebase security rules Allow-DB-Access action allow"""
+
+# Content similar to the uploaded file (17 objects)
+LARGE_SET_CONTENT = """set address Server-Web-01 ip-netmask 192.168.10.10/32
+set address Server-DB-01 ip-netmask 192.168.10.20/32
+set address Workstation-01 ip-netmask 192.168.20.10/32
+set address Workstation-02 ip-netmask 192.168.20.11/32
+set address DMZ-Host-01 ip-netmask 172.16.10.5/32
+set address DMZ-Host-02 ip-netmask 172.16.10.6/32
+set address External-Server-01 ip-netmask 203.0.113.10/32
+set address Guest-Network ip-netmask 192.168.40.0/24
+set address Internal-Subnet-01 ip-netmask 192.168.30.0/24
+set address Internal-Subnet-02 ip-netmask 192.168.31.0/24
+set address Backup-Server-01 ip-netmask 192.168.50.10/32
+set address Monitoring-Host-01 ip-netmask 192.168.60.5/32
+set address Server-Web-01-Redundant ip-netmask 192.168.10.10/32
+set address Server-DB-01-Redundant ip-netmask 192.168.10.20/32
+set address Internal-Subnet-01-Redundant ip-netmask 192.168.30.0/24
+set address DMZ-Host-01-Redundant ip-netmask 172.16.10.5/32
+set address Workstation-01-Redundant ip-netmask 192.168.20.10/32
+
+set rulebase security rules Allow-Web-Access from trust
+set rulebase security rules Allow-Web-Access to untrust
+set rulebase security rules Allow-Web-Access source Server-Web-01
+set rulebase security rules Allow-Web-Access destination any
+set rulebase security rules Allow-Web-Access service service-http
+set rulebase security rules Allow-Web-Access action allow
+
+set rulebase security rules Allow-DB-Access from trust
+set rulebase security rules Allow-DB-Access to dmz
+set rulebase security rules Allow-DB-Access source Server-DB-01
+set rulebase security rules Allow-DB-Access destination any
+set rulebase security rules Allow-DB-Access service service-mysql
+set rulebase security rules Allow-DB-Access action allow
+
+set rulebase security rules Workstation-Outbound from trust
+set rulebase security rules Workstation-Outbound to untrust
+set rulebase security rules Workstation-Outbound source Workstation-01
+set rulebase security rules Workstation-Outbound destination any
+set rulebase security rules Workstation-Outbound service any
+set rulebase security rules Workstation-Outbound action allow"""
+
+# (label, content, expected rules, expected objects)
+INCREMENTAL_SET_CASES = [
+    ("Small content", SMALL_SET_CONTENT, 2, 2),
+    ("Large content", LARGE_SET_CONTENT, 3, 17),
+]
@@ -1,5 +1,6 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from src.database import Base, engine
 from src.routers.audits import router as audits_router
 from src.utils.logging import logger
@@ -22,6 +23,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger JSON bodies (analysis results, bundles) for clients that
+# send Accept-Encoding: gzip; small responses and 304s go out as-is
+app.add_middleware(GZipMiddleware, minimum_size=500)
+
 # Include routers
 app.include_router(audits_router)
 
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request, Response
 from sqlalchemy.orm import Session
 from src.database import get_db
 from src.models import AuditSession, FirewallRule, ObjectDefinition
@@ -16,13 +16,56 @@ from src.utils.parse_config import (
     parse_objects_adaptive,
     analyze_rule_usage
 )
+from src.utils import parse_config, rule_analysis
 from src.utils.logging import logger
 from datetime import datetime
+from pathlib import Path
 from typing import Optional
+import hashlib
 import json
 
 router = APIRouter(prefix="/api/v1/audits", tags=["audits"])
 
+def _analysis_code_version() -> str:
+    """Fingerprint the source of the code that computes analysis payloads."""
+    digest = hashlib.sha256()
+    for path in (parse_config.__file__, rule_analysis.__file__, __file__):
+        digest.update(Path(path).read_bytes())
+    return digest.hexdigest()[:12]
+
+# Changes whenever the analysis code does, so clients holding an older ETag
+# are sent the recomputed payload instead of a 304
+ANALYSIS_VERSION = _analysis_code_version()
+
+def _audit_etag(audit_id: int, file_hash: str) -> str:
+    """
+    Build the entity tag for data derived from a stored audit.
+    
+    Stored rules and objects never change after upload, but the analysis is
+    recomputed on every request, so the tag combines the audit ID and file
+    hash with ANALYSIS_VERSION.
+    """
+    return f'W/"{audit_id}-{file_hash}-{ANALYSIS_VERSION}"'
+
+def _analysis_etag(session: AuditSession) -> str:
+    """Build the entity tag for an audit's analysis results."""
+    return _audit_etag(session.id, session.file_hash)
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an entity tag using weak comparison."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
 @router.post("/")
 async def create_audit_session(
     file: UploadFile = File(...),
@@ -392,6 +435,40 @@ async def list_audit_sessions(db: Session = Depends(get_db)):
             }
         )
 
+@router.get("/latest")
+async def get_latest_audit_session(db: Session = Depends(get_db)):
+    """
+    Get details of the most recent audit session.
+    
+    Lets clients that only need the newest audit skip serializing the
+    whole list returned by GET /.
+    
+    Returns:
+        Detailed audit session information, as returned by GET /{audit_id}
+    """
+    try:
+        latest_id = db.query(AuditSession.id).order_by(AuditSession.id.desc()).limit(1).scalar()
+    except Exception as e:
+        logger.error(f"Error retrieving latest audit session: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "error_code": "INTERNAL_ERROR",
+                "message": "Failed to retrieve audit session"
+            }
+        )
+    
+    if latest_id is None:
+        raise HTTPException(
+            status_code=404,
+            detail={
+                "error_code": "AUDIT_NOT_FOUND",
+                "message": "No audit sessions found"
+            }
+        )
+    
+    return await get_audit_session(latest_id, db=db)
+
 @router.get("/{audit_id}")
 async def get_audit_session(audit_id: int, db: Session = Depends(get_db)):
     """
@@ -450,12 +527,23 @@ async def get_audit_session(audit_id: int, db: Session = Depends(get_db)):
         )
 
 @router.get("/{audit_id}/analysis")
-async def get_audit_analysis(audit_id: int, db: Session = Depends(get_db)):
+async def get_audit_analysis(
+    audit_id: int,
+    db: Session = Depends(get_db),
+    request: Request = None,
+    response: Response = None
+):
     """
     Get analysis results for a specific audit session.
 
+    Responses carry an ETag; a request whose If-None-Match matches it gets
+    an empty 304 without the analysis being recomputed.
+
     Args:
         audit_id: ID of the audit session
+        db: Database session
+        request: Incoming request, used for the If-None-Match header
+        response: Outgoing response, used to set the ETag header
 
     Returns:
         Analysis results including unused objects, duplicate rules, etc.
@@ -473,6 +561,12 @@ async def get_audit_analysis(audit_id: int, db: Session = Depends(get_db)):
                 }
             )
 
+        etag = _analysis_etag(session)
+        if request is not None and _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        if response is not None:
+            response.headers["ETag"] = etag
+
         # Get all objects for this audit
         all_objects = db.query(ObjectDefinition).filter(ObjectDefinition.audit_id == audit_id).all()
 
@@ -653,3 +747,98 @@ async def get_audit_analysis(audit_id: int, db: Session = Depends(get_db)):
                 "message": "Failed to retrieve analysis results"
             }
         )
+
+BUNDLE_PARTS = ("analysis", "metadata")
+
+@router.get("/{audit_id}/bundle")
+async def get_audit_bundle(
+    audit_id: int,
+    include: str = "analysis,metadata",
+    db: Session = Depends(get_db),
+    request: Request = None,
+    response: Response = None
+):
+    """
+    Get an audit session together with its analysis and metadata in a single response.
+
+    Combines GET /{audit_id} and GET /{audit_id}/analysis so clients that
+    display both need one round-trip instead of two. Like the analysis
+    endpoint, responses carry an ETag and a matching If-None-Match gets
+    an empty 304.
+
+    Args:
+        audit_id: ID of the audit session
+        include: Comma-separated parts to add next to the audit ("analysis", "metadata")
+        db: Database session
+        request: Incoming request, used for the If-None-Match header
+        response: Outgoing response, used to set the ETag header
+
+    Returns:
+        JSON response with the audit session details and the requested parts
+    """
+    parts = [part.strip() for part in include.split(",") if part.strip()]
+    unknown = [part for part in parts if part not in BUNDLE_PARTS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error_code": "INVALID_INCLUDE",
+                "message": f"Unknown bundle parts: {', '.join(unknown)}. Allowed: {', '.join(BUNDLE_PARTS)}"
+            }
+        )
+
+    audit_result = await get_audit_session(audit_id, db=db)
+    audit_data = audit_result["data"]
+
+    etag = _audit_etag(audit_data["audit_id"], audit_data["file_hash"])
+    if request is not None and _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    if response is not None:
+        response.headers["ETag"] = etag
+
+    bundle = {"audit": audit_data}
+    if "analysis" in parts:
+        analysis_result = await get_audit_analysis(audit_id, db=db)
+        bundle["analysis"] = analysis_result["data"]
+    if "metadata" in parts:
+        bundle["metadata"] = audit_data["metadata"] or {}
+
+    return {
+        "status": "success",
+        "data": bundle,
+        "message": "Audit bundle retrieved successfully"
+    }
+
+@router.post("/verify")
+async def verify_audit_upload(
+    file: UploadFile = File(...),
+    session_name: Optional[str] = Form(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Upload a configuration file and return its analysis in a single response.
+    
+    Combines POST / and GET /{audit_id}/analysis so verification clients
+    need one round-trip instead of two.
+    
+    Args:
+        file: Uploaded configuration file (XML or set format)
+        session_name: Optional name for the audit session
+        db: Database session
+        
+    Returns:
+        JSON response with the created audit session details and its analysis results
+    """
+    upload_result = await create_audit_session(file=file, session_name=session_name, db=db)
+    audit_data = upload_result["data"]
+    analysis_result = await get_audit_analysis(audit_data["audit_id"], db=db)
+    
+    return {
+        "status": "success",
+        "data": {
+            "audit": audit_data,
+            "analysis": analysis_result["data"]
+        },
+        "message": "Audit session created and analyzed successfully",
+        "timestamp": upload_result["timestamp"]
+    }
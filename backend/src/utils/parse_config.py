@@ -1,9 +1,10 @@
 import hashlib
+import re
 import xml.etree.ElementTree as ET
 import time
 import psutil
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable
 from src.utils.logging import logger
 
 try:
@@ -14,6 +15,49 @@ except ImportError:
     LXML_AVAILABLE = False
     logger.warning("lxml not available, falling back to standard library for streaming parsing")
 
+# Attribute keywords that end a rule name in incremental set commands
+RULE_ATTRIBUTE_KEYWORDS = frozenset(('from', 'to', 'source', 'destination', 'service', 'action', 'application'))
+
+# Incremental set rule command: the (optionally quoted) rule name runs up to the
+# first attribute keyword, which is where the attribute section starts
+INCREMENTAL_RULE_RE = re.compile(
+    r'set (?:rulebase )?security rules ["\']?(?P<name>[^"\']+?)["\']?\s+'
+    r'(?P<attr>from|to|source|destination|service|action|application)'
+)
+INCREMENTAL_RULE_FALLBACK_RE = re.compile(r'set (?:rulebase )?security rules ["\']?([^"\']+)["\']?')
+
+# Every "<keyword> <value>" pair of the attribute section in one scan; service
+# values stop at '[' so a member list is not taken as an object name
+RULE_ATTRIBUTE_RE = re.compile(
+    r'(?<!\S)(?P<attr>from|to|source|destination|action|(?P<service>service)) (["\']?)'
+    r'(?P<value>(?(service)[^"\'\s\[]+|[^"\'\s]+))\3'
+)
+# Starting values for a rule first seen in an incremental set command; each new
+# rule is a shallow copy with rule_name filled in
+INCREMENTAL_RULE_DEFAULTS = {
+    "rule_name": "",
+    "rule_type": "security",
+    "src_zone": "any",
+    "dst_zone": "any",
+    "src": "any",
+    "dst": "any",
+    "service": "any",
+    "action": "allow",
+    "position": 0,  # Will be set later
+    "is_disabled": False,
+    "raw_xml": ""
+}
+
+# Rule field set by each attribute keyword
+RULE_ATTRIBUTE_FIELDS = {
+    'from': 'src_zone',
+    'to': 'dst_zone',
+    'source': 'src',
+    'destination': 'dst',
+    'service': 'service',
+    'action': 'action',
+}
+
 def get_memory_usage():
     """Get current memory usage in MB."""
     try:
@@ -561,6 +605,7 @@ def parse_set_config(set_content: str) -> tuple[List[Dict[str, Any]], List[Dict[
 
         # Use incremental parsing for rules that are built up with multiple set commands
         rules_dict = {}  # rule_name -> rule_data
+        rule_lines = []  # parsed in one batch once objects are done
         objects_data = []
         metadata = {"firmware_version": "unknown", "rule_count": 0, "address_object_count": 0, "service_object_count": 0}
 
@@ -571,7 +616,7 @@ def parse_set_config(set_content: str) -> tuple[List[Dict[str, Any]], List[Dict[
 
             # Parse security rules (incremental format)
             if ('set security rules' in line or 'set rulebase security rules' in line):
-                parse_incremental_set_rule(line, rules_dict)
+                rule_lines.append(line)
 
             # Parse address objects (multiple variations)
             elif 'set address' in line:
@@ -585,6 +630,8 @@ def parse_set_config(set_content: str) -> tuple[List[Dict[str, Any]], List[Dict[
                 if obj_data:
                     objects_data.append(obj_data)
 
+        parse_incremental_set_rules(rule_lines, rules_dict)
+
         # Convert rules_dict to rules_data list
         rules_data = []
         for position, (rule_name, rule_data) in enumerate(rules_dict.items(), 1):
@@ -658,95 +705,78 @@ def parse_incremental_set_rule(line: str, rules_dict: Dict[str, Dict[str, Any]])
     - set security rules "Allow-Web-Access" service service-http
     - set security rules "Allow-Web-Access" action allow
     """
-    try:
-        import re
-
-        # Extract rule name (quoted or unquoted) - handle both formats
-        # Format 1: set security rules "Name" attribute value
-        # Format 2: set rulebase security rules Name attribute value
-        name_match = re.search(r'set (?:rulebase )?security rules ["\']?([^"\']+?)["\']?\s+(?:from|to|source|destination|service|action|application)', line)
-        if not name_match:
-            # Fallback: try to extract just the rule name part
-            name_match = re.search(r'set (?:rulebase )?security rules ["\']?([^"\']+)["\']?', line)
-            if not name_match:
-                return
-            # Clean the rule name by removing attribute keywords
-            full_name = name_match.group(1).strip()
-            # Split on attribute keywords and take the first part
-            attribute_keywords = ['from', 'to', 'source', 'destination', 'service', 'action', 'application']
-            rule_name = full_name
-            for keyword in attribute_keywords:
-                if ' ' + keyword + ' ' in ' ' + full_name + ' ':
-                    rule_name = full_name.split(' ' + keyword)[0].strip()
-                    break
-        else:
-            rule_name = name_match.group(1).strip()
-
-        logger.debug(f"Extracted rule name: '{rule_name}' from line: {line}")
-
-        # Initialize rule if not exists
-        if rule_name not in rules_dict:
-            rules_dict[rule_name] = {
-                "rule_name": rule_name,
-                "rule_type": "security",
-                "src_zone": "any",
-                "dst_zone": "any",
-                "src": "any",
-                "dst": "any",
-                "service": "any",
-                "action": "allow",
-                "position": 0,  # Will be set later
-                "is_disabled": False,
-                "raw_xml": ""
-            }
-
-        rule_data = rules_dict[rule_name]
-
-        # Update rule_data based on the specific attribute being set
-        if ' from ' in line:
-            from_match = re.search(r'from (["\']?)([^"\'\s]+)\1', line)
-            if from_match:
-                rule_data["src_zone"] = from_match.group(2)
-
-        if ' to ' in line:
-            to_match = re.search(r'to (["\']?)([^"\'\s]+)\1', line)
-            if to_match:
-                rule_data["dst_zone"] = to_match.group(2)
-
-        if ' source ' in line:
-            source_match = re.search(r'source (["\']?)([^"\'\s]+)\1', line)
-            if source_match:
-                rule_data["src"] = source_match.group(2)
+    parse_incremental_set_rules((line,), rules_dict)
 
-        if ' destination ' in line:
-            dest_match = re.search(r'destination (["\']?)([^"\'\s]+)\1', line)
-            if dest_match:
-                rule_data["dst"] = dest_match.group(2)
-
-        if ' service ' in line:
-            service_match = re.search(r'service (["\']?)([^"\'\s\[]+)\1', line)
-            if service_match:
-                rule_data["service"] = service_match.group(2)
-
-        if ' action ' in line:
-            action_match = re.search(r'action (["\']?)([^"\'\s]+)\1', line)
-            if action_match:
-                rule_data["action"] = action_match.group(2)
-
-        # Check if rule is disabled
-        if 'disabled yes' in line or 'disable' in line:
-            rule_data["is_disabled"] = True
+def parse_incremental_set_rules(lines: Iterable[str], rules_dict: Dict[str, Dict[str, Any]]) -> None:
+    """
+    Parse a batch of incremental set rule commands into rules_dict.
 
-        # Append to raw_xml for debugging
-        if rule_data["raw_xml"]:
-            rule_data["raw_xml"] += "; " + line
-        else:
-            rule_data["raw_xml"] = line
+    Equivalent to calling parse_incremental_set_rule() on each line in order,
+    with the patterns looked up once for the whole batch rather than per line.
+    """
+    rule_search = INCREMENTAL_RULE_RE.search
+    fallback_search = INCREMENTAL_RULE_FALLBACK_RE.search
+    attribute_scan = RULE_ATTRIBUTE_RE.finditer
+    attribute_fields = RULE_ATTRIBUTE_FIELDS
+    keywords = RULE_ATTRIBUTE_KEYWORDS
+    blank_rule = INCREMENTAL_RULE_DEFAULTS
+
+    for line in lines:
+        try:
+            # Extract rule name (quoted or unquoted) - handle both formats
+            # Format 1: set security rules "Name" attribute value
+            # Format 2: set rulebase security rules Name attribute value
+            name_match = rule_search(line)
+            if not name_match:
+                # Fallback: try to extract just the rule name part
+                name_match = fallback_search(line)
+                if not name_match:
+                    continue
+                attributes_start = name_match.end()
+                # Clean the rule name by removing attribute keywords
+                full_name = name_match.group(1).strip()
+                # Cut the name at the first attribute keyword token
+                tokens = full_name.split()
+                rule_name = full_name
+                for i in range(1, len(tokens)):
+                    if tokens[i] in keywords:
+                        rule_name = ' '.join(tokens[:i])
+                        break
+            else:
+                rule_name = name_match.group('name').strip()
+                attributes_start = name_match.start('attr')
+
+            logger.debug(f"Extracted rule name: '{rule_name}' from line: {line}")
+
+            # Initialize rule if not exists
+            rule_data = rules_dict.get(rule_name)
+            if rule_data is None:
+                rule_data = rules_dict[rule_name] = blank_rule.copy()
+                rule_data["rule_name"] = rule_name
+
+            # Update rule_data from the attributes set on this line; the first
+            # value given for an attribute wins
+            updated = set()
+            for attr_match in attribute_scan(line, attributes_start):
+                field = attribute_fields[attr_match.group('attr')]
+                if field not in updated:
+                    updated.add(field)
+                    rule_data[field] = attr_match.group('value')
+
+            # Check if rule is disabled
+            if 'disabled yes' in line or 'disable' in line:
+                rule_data["is_disabled"] = True
+
+            # Append to raw_xml for debugging
+            if rule_data["raw_xml"]:
+                rule_data["raw_xml"] += "; " + line
+            else:
+                rule_data["raw_xml"] = line
 
-        logger.debug(f"Updated rule '{rule_name}' with: {line}")
+            logger.debug(f"Updated rule '{rule_name}' with: {line}")
 
-    except Exception as e:
-        logger.error(f"Error parsing incremental set rule: {line} - {str(e)}")
+        except Exception as e:
+            logger.error(f"Error parsing incremental set rule: {line} - {str(e)}")
 
 def parse_set_rule(line: str, position: int) -> Dict[str, Any]:
     """
@@ -8,6 +8,7 @@ from typing import List, Dict, Any, Set, Tuple
 from dataclasses import dataclass
 import ipaddress
 import re
+from itertools import islice
 
 logger = logging.getLogger(__name__)
 
@@ -172,7 +173,7 @@ def detect_shadowed_rules(rules: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     
     for i, rule in enumerate(rules):
         # Check if this rule is shadowed by any rule above it
-        for j, higher_rule in enumerate(rules[:i]):
+        for higher_rule in islice(rules, i):
             if _is_rule_shadowed_by(rule, higher_rule):
                 shadowed_rule = {
                     'id': rule.get('id'),
@@ -334,19 +335,18 @@ def _is_unreachable_rule(rule: Dict[str, Any], all_rules: List[Dict[str, Any]])
 def _is_rule_shadowed_by(rule: Dict[str, Any], higher_rule: Dict[str, Any]) -> bool:
     """Check if a rule is completely shadowed by a higher precedence rule."""
     # Simplified shadowing check - could be made more sophisticated
+    higher_action = higher_rule.get('action', '')
+    action = rule.get('action', '')
+    
+    # A higher rule shadows with the same action, or when it denies traffic
+    # this rule would allow. Actions are compared first so most pairs are
+    # rejected before the scope check runs
+    if (higher_action != action and
+        not (higher_action.lower() in ('deny', 'drop') and action.lower() == 'allow')):
+        return False
     
-    # If higher rule has same or broader scope and same action, it shadows
-    if (higher_rule.get('action', '') == rule.get('action', '') and
-        _is_scope_broader_or_equal(higher_rule, rule)):
-        return True
-    
-    # If higher rule denies traffic that this rule would allow, it shadows
-    if (higher_rule.get('action', '').lower() in ['deny', 'drop'] and
-        rule.get('action', '').lower() == 'allow' and
-        _is_scope_broader_or_equal(higher_rule, rule)):
-        return True
-    
-    return False
+    # ... and only if its scope is the same or broader
+    return _is_scope_broader_or_equal(higher_rule, rule)
 
 def _is_rule_completely_covered_by(rule: Dict[str, Any], covering_rule: Dict[str, Any]) -> bool:
     """Check if a rule is completely covered by another rule."""
@@ -14,6 +14,7 @@ from sqlalchemy.orm import sessionmaker
 from src.main import app
 from src.database import get_db, Base
 from src.models import AuditSession, FirewallRule, ObjectDefinition
+from src.routers import audits as audits_router
 
 # Test database setup
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test_firewall_tool.db"
@@ -351,5 +352,197 @@ class TestFileUpload:
         assert hash1 == hash2
         assert len(hash1) == 64  # SHA256 hash length
 
+class TestVerifyUpload:
+    """Test cases for the combined upload-and-analysis endpoint."""
+
+    def test_verify_returns_audit_and_analysis(self, reset_database):
+        """Test that one request creates the audit and returns its analysis."""
+        xml_content = create_valid_xml_content()
+        
+        response = client.post(
+            "/api/v1/audits/verify",
+            files={"file": ("test_verify.xml", xml_content, "application/xml")},
+            data={"session_name": "Test_Verify"}
+        )
+        
+        assert response.status_code == 200
+        
+        data = response.json()["data"]
+        audit = data["audit"]
+        analysis = data["analysis"]
+        assert audit["session_name"] == "Test_Verify"
+        assert analysis["audit_id"] == audit["audit_id"]
+        assert analysis["analysis_summary"]["total_rules"] == audit["metadata"]["rules_stored"]
+        assert analysis["analysis_summary"]["total_objects"] == audit["metadata"]["objects_stored"]
+        
+        # The audit is persisted like a regular upload
+        db = TestingSessionLocal()
+        try:
+            assert db.query(AuditSession).filter(AuditSession.id == audit["audit_id"]).count() == 1
+        finally:
+            db.close()
+
+    def test_verify_rejects_invalid_file_type(self, reset_database):
+        """Test that upload validation errors are passed through unchanged."""
+        response = client.post(
+            "/api/v1/audits/verify",
+            files={"file": ("test.pdf", b"not a config", "application/pdf")}
+        )
+        
+        assert response.status_code == 400
+        assert response.json()["detail"]["error_code"] == "INVALID_FILE_TYPE"
+
+class TestLatestAudit:
+    """Test cases for the latest-audit endpoint."""
+
+    def test_returns_newest_audit(self, reset_database):
+        """Test that the most recently created audit is returned."""
+        for name in ("Test_Older", "Test_Newer"):
+            response = client.post(
+                "/api/v1/audits/",
+                files={"file": ("test_latest.xml", create_valid_xml_content(), "application/xml")},
+                data={"session_name": name}
+            )
+            assert response.status_code == 200
+        newest_id = response.json()["data"]["audit_id"]
+
+        response = client.get("/api/v1/audits/latest")
+
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert data == client.get(f"/api/v1/audits/{newest_id}").json()["data"]
+        assert data["session_name"] == "Test_Newer"
+
+    def test_no_audits_returns_404(self, reset_database):
+        """Test that an empty database is reported as not found."""
+        response = client.get("/api/v1/audits/latest")
+
+        assert response.status_code == 404
+        assert response.json()["detail"]["error_code"] == "AUDIT_NOT_FOUND"
+
+class TestAuditBundle:
+    """Test cases for the combined audit/analysis/metadata endpoint."""
+
+    def _upload(self):
+        """Upload the valid XML fixture and return its audit ID."""
+        response = client.post(
+            "/api/v1/audits/",
+            files={"file": ("test_bundle.xml", create_valid_xml_content(), "application/xml")},
+            data={"session_name": "Test_Bundle"}
+        )
+        assert response.status_code == 200
+        return response.json()["data"]["audit_id"]
+
+    def test_bundle_matches_separate_endpoints(self, reset_database):
+        """Test that the bundle carries the same data as the individual endpoints."""
+        audit_id = self._upload()
+
+        response = client.get(f"/api/v1/audits/{audit_id}/bundle")
+
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert data["audit"] == client.get(f"/api/v1/audits/{audit_id}").json()["data"]
+        assert data["analysis"] == client.get(f"/api/v1/audits/{audit_id}/analysis").json()["data"]
+        assert data["metadata"] == data["audit"]["metadata"]
+
+    def test_bundle_include_limits_parts(self, reset_database):
+        """Test that only the requested parts are returned."""
+        audit_id = self._upload()
+
+        response = client.get(f"/api/v1/audits/{audit_id}/bundle", params={"include": "metadata"})
+
+        assert response.status_code == 200
+        assert set(response.json()["data"]) == {"audit", "metadata"}
+
+    def test_bundle_rejects_unknown_part(self, reset_database):
+        """Test that an unknown include part is rejected."""
+        audit_id = self._upload()
+
+        response = client.get(f"/api/v1/audits/{audit_id}/bundle", params={"include": "rules"})
+
+        assert response.status_code == 400
+        assert response.json()["detail"]["error_code"] == "INVALID_INCLUDE"
+
+    def test_bundle_revalidates_with_etag(self, reset_database):
+        """Test that the bundle carries an ETag and a matching If-None-Match returns 304."""
+        audit_id = self._upload()
+        etag = client.get(f"/api/v1/audits/{audit_id}/bundle").headers["ETag"]
+
+        response = client.get(f"/api/v1/audits/{audit_id}/bundle", headers={"If-None-Match": etag})
+
+        assert response.status_code == 304
+        assert response.content == b""
+
+    def test_bundle_missing_audit_returns_404(self, reset_database):
+        """Test that a missing audit is reported like GET /{audit_id}."""
+        response = client.get("/api/v1/audits/999/bundle")
+
+        assert response.status_code == 404
+        assert response.json()["detail"]["error_code"] == "AUDIT_NOT_FOUND"
+
+class TestAnalysisETag:
+    """Test cases for conditional requests on the analysis endpoint."""
+
+    def _upload(self):
+        """Upload the valid XML fixture and return its audit ID."""
+        response = client.post(
+            "/api/v1/audits/",
+            files={"file": ("test_etag.xml", create_valid_xml_content(), "application/xml")},
+            data={"session_name": "Test_ETag"}
+        )
+        assert response.status_code == 200
+        return response.json()["data"]["audit_id"]
+
+    def test_analysis_response_has_etag(self, reset_database):
+        """Test that analysis responses carry a weak ETag."""
+        audit_id = self._upload()
+        
+        response = client.get(f"/api/v1/audits/{audit_id}/analysis")
+        
+        assert response.status_code == 200
+        assert response.headers["ETag"].startswith('W/"')
+
+    def test_matching_if_none_match_returns_304(self, reset_database):
+        """Test that revalidating with the current ETag returns an empty 304."""
+        audit_id = self._upload()
+        etag = client.get(f"/api/v1/audits/{audit_id}/analysis").headers["ETag"]
+        
+        response = client.get(f"/api/v1/audits/{audit_id}/analysis", headers={"If-None-Match": etag})
+        
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert response.content == b""
+
+    def test_stale_if_none_match_returns_full_body(self, reset_database):
+        """Test that a non-matching ETag gets the full analysis."""
+        audit_id = self._upload()
+        
+        response = client.get(f"/api/v1/audits/{audit_id}/analysis", headers={"If-None-Match": 'W/"stale"'})
+        
+        assert response.status_code == 200
+        assert response.json()["data"]["audit_id"] == audit_id
+
+    def test_etag_changes_with_analysis_version(self, reset_database, monkeypatch):
+        """Test that an ETag issued before an analysis code change no longer matches."""
+        audit_id = self._upload()
+        etag = client.get(f"/api/v1/audits/{audit_id}/analysis").headers["ETag"]
+        monkeypatch.setattr(audits_router, "ANALYSIS_VERSION", "changed")
+        
+        response = client.get(f"/api/v1/audits/{audit_id}/analysis", headers={"If-None-Match": etag})
+        
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+
+    def test_analysis_is_gzipped_when_accepted(self, reset_database):
+        """Test that the analysis body is gzip-encoded for clients that accept it."""
+        audit_id = self._upload()
+        
+        response = client.get(f"/api/v1/audits/{audit_id}/analysis", headers={"Accept-Encoding": "gzip"})
+        
+        assert response.status_code == 200
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert response.headers["ETag"].startswith('W/"')
+        assert response.json()["data"]["audit_id"] == audit_id
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the diagnostic connection pool.
+"""
+
+import pytest
+import sqlite3
+import threading
+import db_pool
+from db_pool import READ_POOL_SIZE, close_all, read_conn, read_snapshot, write_conn
+
+@pytest.fixture(scope="function")
+def pool_db(tmp_path):
+    """Create a database with one audit row and release pooled connections afterwards."""
+    path = str(tmp_path / "pool.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE audit_sessions (id INTEGER PRIMARY KEY, filename TEXT)")
+    conn.execute("INSERT INTO audit_sessions (filename) VALUES ('config.xml')")
+    conn.commit()
+    conn.close()
+    yield path
+    close_all()
+
+class TestReadConn:
+    """Test cases for read_conn."""
+
+    def test_connection_is_reused(self, pool_db):
+        """Test that a released reader is handed out again."""
+        with read_conn(pool_db) as first:
+            pass
+        with read_conn(pool_db) as second:
+            assert second is first
+
+    def test_row_factory_is_reset(self, pool_db):
+        """Test that a borrower's row factory does not leak to the next borrower."""
+        with read_conn(pool_db) as conn:
+            conn.row_factory = sqlite3.Row
+        with read_conn(pool_db) as conn:
+            assert conn.execute("SELECT filename FROM audit_sessions").fetchone() == ('config.xml',)
+
+    def test_idle_readers_are_bounded(self, pool_db):
+        """Test that at most READ_POOL_SIZE idle readers are kept."""
+        borrowed = [read_conn(pool_db) for _ in range(READ_POOL_SIZE + 2)]
+        for ctx in borrowed:
+            ctx.__enter__()
+        for ctx in borrowed:
+            ctx.__exit__(None, None, None)
+        assert db_pool._read_pool(pool_db).qsize() == READ_POOL_SIZE
+
+    def test_reader_usable_from_other_thread(self, pool_db):
+        """Test that pooled readers can be used from worker threads."""
+        with read_conn(pool_db):
+            pass
+        results = []
+
+        def worker():
+            with read_conn(pool_db) as conn:
+                results.append(conn.execute("SELECT COUNT(*) FROM audit_sessions").fetchone()[0])
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        assert results == [1]
+
+class TestReadSnapshot:
+    """Test cases for read_snapshot."""
+
+    def test_reads_share_one_snapshot(self, pool_db):
+        """Test that a write committed mid-block is not seen until the block exits."""
+        # Opening the writer first switches the file to WAL so readers do not block it
+        with write_conn(pool_db):
+            pass
+        with read_snapshot(pool_db) as conn:
+            assert conn.in_transaction
+            assert conn.execute("SELECT COUNT(*) FROM audit_sessions").fetchone()[0] == 1
+            with write_conn(pool_db) as writer:
+                writer.execute("INSERT INTO audit_sessions (filename) VALUES ('other.xml')")
+            assert conn.execute("SELECT COUNT(*) FROM audit_sessions").fetchone()[0] == 1
+        assert not conn.in_transaction
+        with read_snapshot(pool_db) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM audit_sessions").fetchone()[0] == 2
+
+class TestWriteConn:
+    """Test cases for write_conn."""
+
+    def test_commits_on_success(self, pool_db):
+        """Test that writes are visible to readers after the block exits."""
+        with write_conn(pool_db) as conn:
+            conn.execute("INSERT INTO audit_sessions (filename) VALUES ('other.xml')")
+        with read_conn(pool_db) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM audit_sessions").fetchone()[0] == 2
+
+    def test_rolls_back_on_error(self, pool_db):
+        """Test that a failing block leaves the database unchanged."""
+        with pytest.raises(RuntimeError):
+            with write_conn(pool_db) as conn:
+                conn.execute("INSERT INTO audit_sessions (filename) VALUES ('other.xml')")
+                raise RuntimeError("boom")
+        with read_conn(pool_db) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM audit_sessions").fetchone()[0] == 1
+
+    def test_single_writer_connection(self, pool_db):
+        """Test that every writer block shares the same connection."""
+        with write_conn(pool_db) as first:
+            pass
+        with write_conn(pool_db) as second:
+            assert second is first
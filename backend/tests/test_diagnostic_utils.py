@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the shared diagnostic script helpers.
+"""
+
+import pytest
+import sqlite3
+import os
+import threading
+import time
+import diagnostic_utils
+from db_pool import close_all
+from diagnostic_utils import (
+    DIAGNOSTIC_INDEXES,
+    Coalescer,
+    SNAPSHOT_OBJECT_SAMPLES,
+    db_mtime,
+    detect_format,
+    emit,
+    ensure_indexes,
+    get_json_cached,
+    http_session,
+    latest_audit,
+    load_audit_counts,
+    load_audit_rules,
+    load_audit_snapshot,
+    loads_json,
+    note,
+    open_db,
+    set_disk_cache,
+    set_json_output,
+)
+
+@pytest.fixture(scope="function")
+def sample_db(tmp_path):
+    """Create a small SQLite database on disk."""
+    path = tmp_path / "diagnostic.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE audit_sessions (id INTEGER PRIMARY KEY, filename TEXT)")
+    conn.execute("INSERT INTO audit_sessions (filename) VALUES ('config.xml')")
+    conn.commit()
+    conn.close()
+    return str(path)
+
+class TestDetectFormat:
+    """Test cases for detect_format."""
+
+    @pytest.mark.parametrize("filename,expected", [
+        ("policy.txt", "SET"),
+        ("policy.CSV", "CSV"),
+        ("running-config.xml", "XML"),
+        ("export.txt.csv", "CSV"),
+        ("notes.md", "UNKNOWN"),
+        ("", "UNKNOWN"),
+        (None, "UNKNOWN"),
+    ])
+    def test_detect_format(self, filename, expected):
+        """Test that formats are detected from the final extension only."""
+        assert detect_format(filename) == expected
+
+class TestHttpSession:
+    """Test cases for http_session."""
+
+    def test_session_is_shared(self):
+        """Test that every caller gets the same keep-alive session."""
+        assert http_session() is http_session()
+
+    def test_pool_fits_concurrent_requests(self):
+        """Test that the HTTP adapter keeps enough connections for parallel GETs."""
+        adapter = http_session().get_adapter(diagnostic_utils.API_BASE_URL)
+        assert adapter._pool_maxsize == diagnostic_utils.HTTP_POOL_SIZE
+
+class _FakeResponse:
+    """Minimal stand-in for a requests response."""
+
+    def __init__(self, status_code, content=b'', etag=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = {'ETag': etag} if etag else {}
+
+class _FakeSession:
+    """Session that serves canned responses and records request headers."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.sent_headers = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.sent_headers.append(headers or {})
+        return self.responses.pop(0)
+
+class TestGetJsonCached:
+    """Test cases for get_json_cached."""
+
+    @pytest.fixture(autouse=True)
+    def clear_caches(self, monkeypatch, tmp_path):
+        """Start every test with empty ETag and payload caches."""
+        monkeypatch.setattr(diagnostic_utils, '_ETAG_CACHE', {})
+        monkeypatch.setattr(diagnostic_utils, '_JSON_CACHE', {})
+        monkeypatch.setattr(diagnostic_utils, 'JSON_CACHE_DIR', str(tmp_path / "json_cache"))
+        monkeypatch.setattr(diagnostic_utils, '_disk_cache_enabled', True)
+
+    def test_revalidates_and_reuses_payload_on_304(self, monkeypatch):
+        """Test that the stored ETag is sent back and a 304 returns the cached body."""
+        session = _FakeSession([_FakeResponse(200, b'{"data": {"n": 1}}', 'W/"1-abc"'), _FakeResponse(304)])
+        monkeypatch.setattr(diagnostic_utils, '_http_session', session)
+
+        first = get_json_cached('http://api/audits/1/analysis')
+        second = get_json_cached('http://api/audits/1/analysis')
+
+        assert first == (200, {"data": {"n": 1}})
+        assert second[0] == 200 and second[1] is first[1]
+        assert session.sent_headers == [{}, {'If-None-Match': 'W/"1-abc"'}]
+
+    def test_payload_survives_process_restart(self, monkeypatch):
+        """Test that a later run revalidates from the on-disk cache and skips the download."""
+        session = _FakeSession([_FakeResponse(200, b'{"data": {"n": 1}}', 'W/"1-abc"'), _FakeResponse(304)])
+        monkeypatch.setattr(diagnostic_utils, '_http_session', session)
+        get_json_cached('http://api/audits/1/analysis')
+
+        # A new process starts with empty in-memory caches
+        monkeypatch.setattr(diagnostic_utils, '_ETAG_CACHE', {})
+        monkeypatch.setattr(diagnostic_utils, '_JSON_CACHE', {})
+
+        assert get_json_cached('http://api/audits/1/analysis') == (200, {"data": {"n": 1}})
+        assert session.sent_headers[-1] == {'If-None-Match': 'W/"1-abc"'}
+
+    @pytest.mark.parametrize("stored", [b'not json', b'{"etag": "x"}', b'[1, 2, 3]', b'[1, {}]'])
+    def test_malformed_cache_file_is_a_miss(self, monkeypatch, stored):
+        """Test that an unreadable cache file is ignored and replaced."""
+        url = 'http://api/audits/1/analysis'
+        os.makedirs(diagnostic_utils.JSON_CACHE_DIR)
+        with open(diagnostic_utils._json_cache_path(url), 'wb') as f:
+            f.write(stored)
+        session = _FakeSession([_FakeResponse(200, b'{"data": {"n": 1}}', 'W/"1-abc"')])
+        monkeypatch.setattr(diagnostic_utils, '_http_session', session)
+
+        assert get_json_cached(url) == (200, {"data": {"n": 1}})
+        assert session.sent_headers == [{}]
+        with open(diagnostic_utils._json_cache_path(url), 'rb') as f:
+            assert loads_json(f.read()) == ['W/"1-abc"', {"data": {"n": 1}}]
+
+    def test_disabled_disk_cache_is_not_used(self, monkeypatch):
+        """Test that set_disk_cache(False) neither reads nor writes cache files."""
+        session = _FakeSession([_FakeResponse(200, b'{"data": {"n": 1}}', 'W/"1-abc"')])
+        monkeypatch.setattr(diagnostic_utils, '_http_session', session)
+        set_disk_cache(False)
+
+        assert get_json_cached('http://api/audits/1/analysis') == (200, {"data": {"n": 1}})
+        assert not os.path.exists(diagnostic_utils.JSON_CACHE_DIR)
+
+    def test_error_status_returns_no_payload(self, monkeypatch):
+        """Test that non-200 responses are reported without a payload."""
+        monkeypatch.setattr(diagnostic_utils, '_http_session', _FakeSession([_FakeResponse(404)]))
+        assert get_json_cached('http://api/audits/9/analysis') == (404, None)
+
+class TestCoalescer:
+    """Test cases for Coalescer."""
+
+    def _run_concurrently(self, coalescer, fn, waiters=3):
+        """Start one leader call, let `waiters` identical calls pile up behind it, then release it."""
+        started = threading.Event()
+        release = threading.Event()
+        outcomes = []
+
+        def leader_fn():
+            started.set()
+            release.wait(5)
+            return fn()
+
+        def call(target):
+            try:
+                outcomes.append(('ok', coalescer.execute('key', target)))
+            except Exception as exc:
+                outcomes.append(('error', exc))
+
+        threads = [threading.Thread(target=call, args=(leader_fn,))]
+        threads[0].start()
+        started.wait(5)
+        threads += [threading.Thread(target=call, args=(fn,)) for _ in range(waiters)]
+        for thread in threads[1:]:
+            thread.start()
+        # Give the waiters time to reach the in-flight future before the leader finishes
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        return outcomes
+
+    def test_concurrent_calls_share_one_result(self):
+        """Test that callers arriving mid-flight get the leader's result without calling fn."""
+        calls = []
+        outcomes = self._run_concurrently(Coalescer(), lambda: calls.append(1) or {"n": 1})
+
+        assert len(calls) == 1
+        assert len(outcomes) == 4
+        assert all(outcome == ('ok', {"n": 1}) for outcome in outcomes)
+
+    def test_exception_reaches_every_waiter(self):
+        """Test that a failed call is reported to all callers and then forgotten."""
+        coalescer = Coalescer()
+
+        def fail():
+            raise ConnectionError("down")
+
+        outcomes = self._run_concurrently(coalescer, fail)
+
+        assert [kind for kind, _ in outcomes] == ['error'] * 4
+        assert coalescer.execute('key', lambda: 'fresh') == 'fresh'
+
+class TestLoadsJson:
+    """Test cases for loads_json."""
+
+    @pytest.mark.parametrize("data", ['{"rule_count": 3, "firmware_version": "10.1.0"}', b'{"rule_count": 3, "firmware_version": "10.1.0"}'])
+    def test_decodes_text_and_bytes(self, data):
+        """Test that both str and bytes payloads decode to the same dict."""
+        assert loads_json(data) == {"rule_count": 3, "firmware_version": "10.1.0"}
+
+class TestEmit:
+    """Test cases for emit and note."""
+
+    @pytest.fixture(autouse=True)
+    def restore_text_output(self):
+        yield
+        set_json_output(False)
+
+    def test_text_mode_prints_human_lines(self, capsys):
+        """Test that text mode prints the formatted line and headings."""
+        note("Summary:")
+        emit("kv", "   total_rules: 10", key="total_rules", value=10)
+        emit("result", None, success=True)
+        assert capsys.readouterr().out == "Summary:\n   total_rules: 10\n"
+
+    def test_json_mode_prints_one_record_per_finding(self, capsys):
+        """Test that JSON mode drops headings and writes decodable records."""
+        set_json_output(True)
+        note("Summary:")
+        emit("kv", "   total_rules: 10", key="total_rules", value=10)
+        emit("result", None, success=True)
+        lines = capsys.readouterr().out.splitlines()
+        assert [loads_json(line) for line in lines] == [
+            {"event": "kv", "key": "total_rules", "value": 10},
+            {"event": "result", "success": True},
+        ]
+
+class TestDbMtime:
+    """Test cases for db_mtime."""
+
+    def test_key_changes_after_write(self, sample_db):
+        """Test that a write landing only in the -wal file changes the key."""
+        conn = open_db(sample_db, read_only=False)
+        # Pin both mtimes first so a change can only come from the write below
+        os.utime(sample_db, ns=(0, 0))
+        if os.path.exists(f'{sample_db}-wal'):
+            os.utime(f'{sample_db}-wal', ns=(0, 0))
+        before = db_mtime(sample_db)
+        conn.execute("INSERT INTO audit_sessions (filename) VALUES ('other.xml')")
+        conn.commit()
+        after = db_mtime(sample_db)
+        conn.close()
+        # The commit is not checkpointed, so only the WAL part of the key moves
+        assert after[0] == before[0]
+        assert after[1] != before[1]
+
+class TestLatestAudit:
+    """Test cases for latest_audit."""
+
+    @pytest.fixture(scope="function")
+    def sessions_db(self, tmp_path):
+        """Create a database with two audit sessions."""
+        path = tmp_path / "sessions.db"
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE audit_sessions (id INTEGER PRIMARY KEY, session_name TEXT, filename TEXT, start_time TEXT)")
+        conn.execute("INSERT INTO audit_sessions (session_name, filename, start_time) VALUES ('first', 'a.xml', '2024-01-01')")
+        conn.execute("INSERT INTO audit_sessions (session_name, filename, start_time) VALUES ('second', 'b.txt', '2024-01-02')")
+        conn.commit()
+        conn.close()
+        return str(path)
+
+    def test_returns_newest_session(self, sessions_db):
+        """Test that the highest id is returned with its details."""
+        assert latest_audit(sessions_db) == (2, 'second', 'b.txt', '2024-01-02')
+
+    def test_cache_refreshes_after_write(self, sessions_db):
+        """Test that a new session is seen once the database has been written."""
+        assert latest_audit(sessions_db)[0] == 2
+        os.utime(sessions_db, ns=(0, 0))
+        conn = sqlite3.connect(sessions_db)
+        conn.execute("INSERT INTO audit_sessions (session_name, filename, start_time) VALUES ('third', 'c.csv', '2024-01-03')")
+        conn.commit()
+        conn.close()
+        assert latest_audit(sessions_db)[0] == 3
+
+    def test_no_sessions(self, sessions_db):
+        """Test that an empty table yields None."""
+        conn = sqlite3.connect(sessions_db)
+        conn.execute("DELETE FROM audit_sessions")
+        conn.commit()
+        conn.close()
+        assert latest_audit(sessions_db) is None
+
+class TestOpenDb:
+    """Test cases for open_db."""
+
+    def test_read_only_connection_reads(self, sample_db):
+        """Test that a read-only connection can query existing data."""
+        conn = open_db(sample_db)
+        assert conn.execute("SELECT filename FROM audit_sessions").fetchone() == ('config.xml',)
+        assert conn.execute("PRAGMA query_only").fetchone() == (1,)
+        conn.close()
+
+    def test_read_only_connection_rejects_writes(self, sample_db):
+        """Test that a read-only connection cannot modify the database."""
+        conn = open_db(sample_db)
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO audit_sessions (filename) VALUES ('other.xml')")
+        conn.close()
+
+    def test_read_only_connection_missing_file(self, tmp_path):
+        """Test that opening a missing database read-only fails instead of creating it."""
+        missing = tmp_path / "missing.db"
+        with pytest.raises(sqlite3.OperationalError):
+            open_db(str(missing))
+        assert not missing.exists()
+
+    def test_writable_connection_missing_file(self, tmp_path):
+        """Test that opening a missing database for writing fails instead of creating it."""
+        missing = tmp_path / "missing.db"
+        with pytest.raises(sqlite3.OperationalError):
+            open_db(str(missing), read_only=False)
+        assert not missing.exists()
+
+    def test_writable_connection_uses_wal(self, sample_db):
+        """Test that writable connections switch the journal to WAL."""
+        conn = open_db(sample_db, read_only=False)
+        assert conn.execute("PRAGMA journal_mode").fetchone() == ('wal',)
+        assert conn.execute("PRAGMA synchronous").fetchone() == (1,)
+        conn.close()
+
+class TestEnsureIndexes:
+    """Test cases for ensure_indexes."""
+
+    @pytest.fixture(scope="function")
+    def audit_db(self, tmp_path):
+        """Create a database with the session, rule and object tables."""
+        path = tmp_path / "audit.db"
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE firewall_rules (id INTEGER PRIMARY KEY, audit_id INTEGER, rule_name TEXT, position INTEGER, is_disabled BOOLEAN)")
+        conn.execute("""CREATE TABLE audit_sessions (id INTEGER PRIMARY KEY, session_name VARCHAR(255), start_time DATETIME,
+                        end_time DATETIME, filename VARCHAR(255), file_hash VARCHAR(64), config_metadata JSON)""")
+        conn.execute("CREATE TABLE object_definitions (id INTEGER PRIMARY KEY, audit_id INTEGER, object_type TEXT, name TEXT, value TEXT)")
+        conn.commit()
+        conn.close()
+        return str(path)
+
+    def test_creates_missing_indexes_once(self, audit_db):
+        """Test that indexes are created on first call and skipped afterwards."""
+        writer = open_db(audit_db, read_only=False)
+        assert ensure_indexes(writer) == len(DIAGNOSTIC_INDEXES)
+        assert ensure_indexes(writer) == 0
+        writer.close()
+
+        conn = open_db(audit_db)
+        names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        conn.close()
+        assert set(DIAGNOSTIC_INDEXES) <= names
+
+    @pytest.mark.parametrize("query,params,index", [
+        ("SELECT rule_name FROM firewall_rules WHERE audit_id = ? ORDER BY position", (1,),
+         "INDEX idx_rules_audit_pos"),
+        ("SELECT COUNT(*) FROM firewall_rules WHERE audit_id = ? AND is_disabled = 1", (1,),
+         "COVERING INDEX idx_rules_audit_disabled"),
+        ("SELECT id, session_name, filename, start_time FROM audit_sessions ORDER BY id DESC LIMIT 1", (),
+         "COVERING INDEX idx_audit_recent"),
+        ("SELECT object_type, value, GROUP_CONCAT(name) FROM object_definitions "
+         "WHERE audit_id = ? GROUP BY object_type, value HAVING COUNT(*) > 1", (1,),
+         "COVERING INDEX idx_objs_audit_type_value"),
+    ])
+    def test_diagnostic_query_uses_index(self, audit_db, query, params, index):
+        """Test that each diagnostic query is planned against its index."""
+        writer = open_db(audit_db, read_only=False)
+        ensure_indexes(writer)
+        writer.close()
+        conn = open_db(audit_db)
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+        conn.close()
+        assert any(index in row[-1] for row in plan)
+
+class TestLoadAuditSnapshot:
+    """Test cases for load_audit_snapshot."""
+
+    @pytest.fixture(scope="function")
+    def snapshot_db(self, tmp_path):
+        """Create a database holding rules and objects for two audits and release pooled readers afterwards."""
+        path = tmp_path / "snapshot.db"
+        conn = sqlite3.connect(path)
+        conn.execute("""CREATE TABLE firewall_rules (id INTEGER PRIMARY KEY, audit_id INTEGER, rule_name TEXT,
+                        src_zone TEXT, dst_zone TEXT, src TEXT, dst TEXT, service TEXT, action TEXT, position INTEGER)""")
+        conn.execute("""CREATE TABLE object_definitions (id INTEGER PRIMARY KEY, audit_id INTEGER, object_type TEXT,
+                        name TEXT, value TEXT, used_in_rules INTEGER)""")
+        for i in range(SNAPSHOT_OBJECT_SAMPLES + 2):
+            conn.execute("INSERT INTO object_definitions (audit_id, object_type, name, value, used_in_rules) VALUES (1, 'address', ?, ?, ?)",
+                         (f"obj-{i:02d}", f"10.0.0.{i}", i % 2))
+        conn.execute("INSERT INTO firewall_rules (audit_id, rule_name, src_zone, dst_zone, src, dst, service, action, position) VALUES (1, 'second', 'trust', 'untrust', 'any', 'any', 'any', 'allow', 2)")
+        conn.execute("INSERT INTO firewall_rules (audit_id, rule_name, src_zone, dst_zone, src, dst, service, action, position) VALUES (1, 'first', 'trust', 'untrust', 'any', 'any', 'any', 'deny', 1)")
+        conn.execute("INSERT INTO firewall_rules (audit_id, rule_name, position) VALUES (2, 'other', 1)")
+        conn.commit()
+        conn.close()
+        yield str(path)
+        # Snapshots are read through pooled connections
+        close_all()
+
+    def test_counts_and_ordered_samples(self, snapshot_db):
+        """Test that counts cover every row while samples are capped and ordered."""
+        snapshot = load_audit_snapshot(1, snapshot_db)
+        assert snapshot['object_count'] == SNAPSHOT_OBJECT_SAMPLES + 2
+        assert snapshot['rule_count'] == 2
+        assert len(snapshot['objects']) == SNAPSHOT_OBJECT_SAMPLES
+        assert snapshot['objects'][0] == ('obj-00', 'address', '10.0.0.0', 0)
+        assert [rule[:2] for rule in snapshot['rules']] == [(1, 'first'), (2, 'second')]
+
+    def test_cached_per_audit(self, snapshot_db):
+        """Test that repeat lookups reuse the snapshot and audits stay separate."""
+        assert load_audit_snapshot(1, snapshot_db) is load_audit_snapshot(1, snapshot_db)
+        other = load_audit_snapshot(2, snapshot_db)
+        assert other['rule_count'] == 1 and other['object_count'] == 0
+
+    def test_cached_until_database_changes(self, snapshot_db):
+        """Test that a write made after the first lookup is seen by the next one."""
+        assert load_audit_snapshot(1, snapshot_db)['rule_count'] == 2
+        os.utime(snapshot_db, ns=(0, 0))
+        conn = sqlite3.connect(snapshot_db)
+        conn.execute("DELETE FROM firewall_rules WHERE rule_name = 'second'")
+        conn.commit()
+        conn.close()
+        assert load_audit_snapshot(1, snapshot_db)['rule_count'] == 1
+
+class TestLoadAuditRules:
+    """Test cases for load_audit_rules."""
+
+    @pytest.fixture(scope="function")
+    def rules_db(self, tmp_path):
+        """Create a database holding two rules for one audit, inserted out of order."""
+        path = tmp_path / "rules.db"
+        conn = sqlite3.connect(path)
+        conn.execute("""CREATE TABLE firewall_rules (id INTEGER PRIMARY KEY, audit_id INTEGER, rule_name TEXT, src_zone TEXT,
+                        dst_zone TEXT, src TEXT, dst TEXT, service TEXT, action TEXT, position INTEGER, is_disabled BOOLEAN)""")
+        conn.execute("INSERT INTO firewall_rules (audit_id, rule_name, src_zone, dst_zone, src, dst, service, action, position, is_disabled) "
+                     "VALUES (1, 'second', 'trust', 'untrust', 'any', 'any', 'any', 'deny', 2, 1)")
+        conn.execute("INSERT INTO firewall_rules (audit_id, rule_name, src_zone, dst_zone, src, dst, service, action, position, is_disabled) "
+                     "VALUES (1, 'first', 'trust', 'untrust', 'web', 'any', 'http', 'allow', 1, 0)")
+        conn.commit()
+        conn.close()
+        return str(path)
+
+    def test_rules_ordered_with_signature(self, rules_db):
+        """Test that rules come back by position with their comparison signature."""
+        rules = load_audit_rules(1, rules_db)
+        assert [rule.rule_name for rule in rules] == ['first', 'second']
+        assert rules[0].signature == ('trust', 'untrust', 'web', 'any', 'http', 'allow')
+        assert rules[1].is_disabled
+
+    def test_cached_until_database_changes(self, rules_db):
+        """Test that repeat calls share one result until the database is written."""
+        assert load_audit_rules(1, rules_db) is load_audit_rules(1, rules_db)
+        os.utime(rules_db, ns=(0, 0))
+        conn = sqlite3.connect(rules_db)
+        conn.execute("DELETE FROM firewall_rules WHERE rule_name = 'second'")
+        conn.commit()
+        conn.close()
+        assert [rule.rule_name for rule in load_audit_rules(1, rules_db)] == ['first']
+
+class TestLoadAuditCounts:
+    """Test cases for load_audit_counts."""
+
+    @pytest.fixture(scope="function")
+    def counts_db(self, tmp_path):
+        """Create a database with used/unused objects and enabled/disabled rules."""
+        path = tmp_path / "counts.db"
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE firewall_rules (id INTEGER PRIMARY KEY, audit_id INTEGER, rule_name TEXT, is_disabled BOOLEAN)")
+        conn.execute("CREATE TABLE object_definitions (id INTEGER PRIMARY KEY, audit_id INTEGER, name TEXT, used_in_rules INTEGER)")
+        conn.executemany("INSERT INTO object_definitions (audit_id, name, used_in_rules) VALUES (1, ?, ?)",
+                         [("a", 0), ("b", 2), ("c", 1), ("d", None)])
+        conn.executemany("INSERT INTO firewall_rules (audit_id, rule_name, is_disabled) VALUES (1, ?, ?)",
+                         [("r1", 0), ("r2", 1), ("r3", None)])
+        conn.commit()
+        conn.close()
+        return str(path)
+
+    def test_usage_and_disabled_counts(self, counts_db):
+        """Test that usage and disabled totals match the row-level definitions."""
+        conn = open_db(counts_db)
+        counts = load_audit_counts(conn, 1)
+        conn.close()
+        assert counts == {'objects': 4, 'used_objects': 2, 'unused_objects': 1, 'rules': 3, 'disabled_rules': 1}
+
+    def test_empty_audit_counts_are_zero(self, counts_db):
+        """Test that an audit without rows reports zeros rather than None."""
+        conn = open_db(counts_db)
+        counts = load_audit_counts(conn, 2)
+        conn.close()
+        assert set(counts.values()) == {0}
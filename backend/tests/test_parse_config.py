@@ -7,7 +7,8 @@ Task 16: Write Unit Tests for Set-Format Parsing
 
 import pytest
 import logging
-from src.utils.parse_config import parse_rules, parse_objects, parse_metadata, parse_set_config
+from src.utils.parse_config import parse_rules, parse_objects, parse_metadata, parse_set_config, parse_incremental_set_rule, parse_incremental_set_rules
+from set_samples import INCREMENTAL_SET_CASES
 
 # Configure logging for test traceability
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -433,6 +434,15 @@ class TestSETFormatParsing:
             assert "empty" in error_message.lower(), f"Error should mention empty content: {error_message}"
             logger.info(f"parse_set_config correctly raised error for empty content: {error_message}")
 
+    @pytest.mark.parametrize("label,set_content,expected_rules,expected_objects", INCREMENTAL_SET_CASES)
+    def test_parse_set_config_consolidates_incremental_rules(self, label, set_content, expected_rules, expected_objects):
+        """Test that per-field 'set rulebase' lines are consolidated into one rule per name."""
+        rules, objects, metadata = parse_set_config(set_content)
+
+        assert len(rules) == expected_rules, f"{label}: expected {expected_rules} rules, got {len(rules)}"
+        assert len(objects) == expected_objects, f"{label}: expected {expected_objects} objects, got {len(objects)}"
+        assert len({rule["rule_name"] for rule in rules}) == len(rules), f"{label}: duplicate rule names"
+
     def test_parse_set_config_specific_rules(self):
         """Test parsing of specific SET rule formats."""
         logger.info("Testing parse_set_config with specific rule formats")
@@ -470,5 +480,40 @@ class TestSETFormatParsing:
 
         logger.info("Specific SET rule format test completed successfully")
 
+    def test_parse_incremental_set_rule_reads_every_attribute_on_a_line(self):
+        """Test that a one-line rule sets all of its attributes, with quoted values unwrapped."""
+        rules_dict = {}
+
+        parse_incremental_set_rule(
+            'set security rules "Allow-Web" from trust to \'untrust\' source "Web-Server-1" '
+            'destination any service [ http https ] action deny',
+            rules_dict
+        )
+        parse_incremental_set_rule('set security rules "Allow-Web" service service-http', rules_dict)
+
+        rule = rules_dict["Allow-Web"]
+        assert (rule["src_zone"], rule["dst_zone"], rule["src"], rule["dst"], rule["action"]) == \
+            ("trust", "untrust", "Web-Server-1", "any", "deny")
+        assert rule["service"] == "service-http", "A member list should not be stored as the service name"
+
+    def test_parse_incremental_set_rules_matches_line_by_line_parsing(self):
+        """Test that the batch parser builds the same rules as per-line calls."""
+        lines = [
+            "set rulebase security rules Allow-Web-Access from trust",
+            "set rulebase security rules Allow-DB-Access from trust to dmz",
+            "set rulebase security rules Allow-Web-Access source Server-Web-01",
+            "set rulebase security rules Allow-Web-Access action allow",
+            "set rulebase security rules Allow-DB-Access action deny",
+        ]
+        expected = {}
+        for line in lines:
+            parse_incremental_set_rule(line, expected)
+
+        rules_dict = {}
+        parse_incremental_set_rules(iter(lines), rules_dict)
+
+        assert rules_dict == expected
+        assert list(rules_dict) == ["Allow-Web-Access", "Allow-DB-Access"]
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])